@@ -45,6 +45,10 @@ class Settings(BaseSettings):
     openwakeword_inference_framework: Literal["onnx", "tflite"] = Field(
         default="tflite", env="OPENWAKEWORD_INFERENCE_FRAMEWORK"
     )
+    openwakeword_batch_chunks: int = Field(
+        default=1, ge=1, env="OPENWAKEWORD_BATCH_CHUNKS"
+    )
+    openwakeword_quantize: bool = Field(default=False, env="OPENWAKEWORD_QUANTIZE")
     
     # API settings - LLM providers
     openai_api_key: Optional[str] = Field(default=None, env="OPENAI_API_KEY")
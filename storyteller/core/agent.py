@@ -6,6 +6,7 @@ Implements streaming pipeline for concurrent story generation, TTS synthesis, an
 import asyncio
 import logging
 import time
+import uuid
 from typing import Optional, Dict, Any, Callable, List
 from dataclasses import dataclass
 from enum import Enum
@@ -175,7 +176,7 @@ class StorytellingAgent:
         try:
             # Create story session
             session = StorySession(
-                session_id=f"session_{int(time.time())}",
+                session_id=f"session_{uuid.uuid4().hex}",
                 prompt=prompt,
                 start_time=time.time(),
                 language=kwargs.get("language", self.settings.story_language),
@@ -498,6 +499,8 @@ class StorytellingAgent:
                 "session_id": self.current_session.session_id,
                 "prompt": self.current_session.prompt,
                 "language": self.current_session.language,
+                "age_rating": self.current_session.age_rating,
+                "start_time": self.current_session.start_time,
                 "paragraphs_generated": self.current_session.paragraphs_generated,
                 "paragraphs_played": self.current_session.paragraphs_played,
                 "duration": time.time() - self.current_session.start_time,
@@ -8,6 +8,7 @@ import logging
 import signal
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 from contextlib import asynccontextmanager
@@ -33,13 +34,15 @@ from .hal.audio_devices import create_audio_device
 from .hal.gpio_manager import create_gpio_manager
 from .core.agent import StorytellingAgent
 from .utils.safety_filter import SafetyFilter
+from .utils.event_loop import run_async
 from .storage.models import create_database_engine, create_tables, get_database_session, init_default_preferences
 from .storage.story_library import StoryLibrary
+from .storage.event_writer import EventWriter, archive_events_by_day
 
 # Web interface
 try:
     import uvicorn
-    from .web.app import create_app
+    from .web.app import WS_PING_INTERVAL, WS_PING_TIMEOUT, create_app, server_backends
     WEB_AVAILABLE = True
 except ImportError:
     uvicorn = None
@@ -92,6 +95,10 @@ class StorytellerApplication:
         )
         self.agent: Optional[StorytellingAgent] = None
         self.database_engine = None
+        self.event_writer: Optional[EventWriter] = None
+        # Blocking database work stays off the default executor used by the
+        # wake word callbacks
+        self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
         self.story_library: Optional[StoryLibrary] = None
         self.web_server_task: Optional[asyncio.Task] = None
         self.shutdown_event = asyncio.Event()
@@ -160,9 +167,16 @@ class StorytellerApplication:
             # Create tables
             await create_tables(self.database_engine)
             
+            # Move old events out of the hot table
+            await archive_events_by_day(self.database_engine)
+            
+            # Start the batched event writer
+            self.event_writer = EventWriter(self.database_engine, executor=self.db_executor)
+            await self.event_writer.start()
+            
             # Initialize story library
             session = await get_database_session(self.database_engine)
-            self.story_library = StoryLibrary(session)
+            self.story_library = StoryLibrary(session, event_writer=self.event_writer)
             
             # Initialize default preferences
             await init_default_preferences(session)
@@ -398,6 +412,8 @@ class StorytellerApplication:
             elif self.settings.wakeword_engine == "openwakeword":
                 wakeword_config.update({
                     "inference_framework": self.settings.openwakeword_inference_framework,
+                    "batch_chunks": self.settings.openwakeword_batch_chunks,
+                    "quantize": self.settings.openwakeword_quantize,
                     "model_paths": [self.settings.openwakeword_model_path] if self.settings.openwakeword_model_path else []
                 })
             
@@ -429,7 +445,10 @@ class StorytellerApplication:
                 host="0.0.0.0",
                 port=5000,
                 log_level="info",
-                access_log=False  # Reduce log spam
+                ws_ping_interval=WS_PING_INTERVAL,
+                ws_ping_timeout=WS_PING_TIMEOUT,
+                access_log=False,  # Reduce log spam
+                **server_backends()
             )
             
             # Start web server in background
@@ -453,7 +472,7 @@ class StorytellerApplication:
             from .web.app import web_app
             
             # Initialize web app with components
-            await web_app.initialize(self.agent, self.story_library)
+            await web_app.initialize(self.agent, self.story_library, self.database_engine)
             
             logger.info("Web application components initialized")
             
@@ -617,6 +636,11 @@ class StorytellerApplication:
             if self.hardware_manager:
                 await self.hardware_manager.cleanup()
             
+            # Flush queued events
+            if self.event_writer:
+                await self.event_writer.stop()
+            self.db_executor.shutdown(wait=True)
+            
             # Close database
             if self.database_engine:
                 await self.database_engine.dispose()
@@ -665,7 +689,7 @@ if CLICK_AVAILABLE:
                 await app.initialize()
                 await app.run()
             
-            asyncio.run(run_app())
+            run_async(run_app())
             
         except KeyboardInterrupt:
             logger.info("Interrupted by user")
@@ -694,7 +718,7 @@ if CLICK_AVAILABLE:
                 await app.cleanup()
         
         try:
-            asyncio.run(tell_story())
+            run_async(tell_story())
         except KeyboardInterrupt:
             logger.info("Story interrupted by user")
 
@@ -716,7 +740,7 @@ if CLICK_AVAILABLE:
                     detection = WakewordDetection(
                         keyword="test",
                         confidence=1.0,
-                        timestamp=time.time(),
+                        timestamp=time.monotonic_ns(),
                         engine_name="manual"
                     )
                     
@@ -731,7 +755,7 @@ if CLICK_AVAILABLE:
                 await app.cleanup()
         
         try:
-            asyncio.run(simulate_wake())
+            run_async(simulate_wake())
         except KeyboardInterrupt:
             logger.info("Wake simulation interrupted")
 
@@ -774,7 +798,7 @@ if CLICK_AVAILABLE:
                 await app.cleanup()
         
         try:
-            asyncio.run(show_status())
+            run_async(show_status())
         except Exception as e:
             click.echo(f"Error: {e}")
 
@@ -823,7 +847,7 @@ if CLICK_AVAILABLE:
                 await app.cleanup()
         
         try:
-            asyncio.run(run_tests())
+            run_async(run_tests())
         except Exception as e:
             click.echo(f"Error: {e}")
 
@@ -840,7 +864,7 @@ def main():
 def wake_command():
     """Wake command entry point for systemd integration."""
     try:
-        asyncio.run(wake.callback())
+        run_async(wake.callback())
     except Exception as e:
         logger.error(f"Wake command error: {e}")
         sys.exit(1)
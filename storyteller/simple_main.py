@@ -28,6 +28,7 @@ from .core.agent import StorytellingAgent
 from .storage.models import create_database_engine, create_tables
 from .storage.story_library import StoryLibrary
 from .utils.safety_filter import SafetyFilter
+from .utils.event_loop import run_async
 
 # Set up logging
 logging.basicConfig(
@@ -301,7 +302,7 @@ class StorytellerApplication:
                 detection = WakewordDetection(
                     keyword="button_press",
                     confidence=1.0,
-                    timestamp=time.time(),
+                    timestamp=time.monotonic_ns(),
                     engine_name="hardware_button"
                 )
                 
@@ -390,7 +391,7 @@ def main():
     """Main entry point."""
     try:
         # Run the service
-        exit_code = asyncio.run(run_service())
+        exit_code = run_async(run_service())
         sys.exit(exit_code)
         
     except Exception as e:
@@ -0,0 +1,271 @@
+"""
+Batched background writer for system events.
+Keeps event logging off the request path by queueing rows in memory and
+writing them in batches over one dedicated database connection.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Connection, create_engine, event, insert, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.pool import StaticPool
+
+from .models import SystemEvent, set_sqlite_pragmas
+
+logger = logging.getLogger(__name__)
+
+
+class EventWriter:
+    """
+    Queues SystemEvent rows and writes them in batches.
+
+    One INSERT and one commit are issued per batch instead of per event,
+    so a burst of events costs a single thread hop and a single fsync.
+    For file-backed SQLite the batch runs on a plain sqlite3 connection
+    owned by a one-thread executor, skipping aiosqlite's per-statement
+    queue round trip; other databases use an async connection.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        max_queue_size: int = 1000,
+        executor: Optional[ThreadPoolExecutor] = None
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        # Seconds to keep collecting after the first event of a batch
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        # Batch being collected; kept on the writer so stop() can flush it
+        self._pending: List[Dict[str, Any]] = []
+        self._conn: Optional[AsyncConnection] = None
+        self._sync_conn: Optional[Connection] = None
+        # Threads for the sqlite3 path; a caller-supplied pool is left running on stop()
+        self._executor: Optional[ThreadPoolExecutor] = executor
+        self._owns_executor = executor is None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the background writer task is active."""
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """Open the writer connection and start draining the queue."""
+        if self.is_running:
+            return
+
+        url = self.engine.url
+        if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-writer")
+            self._sync_conn = await self._run_sync(self._connect_sync)
+        else:
+            self._conn = await self.engine.connect()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Event writer started")
+
+    async def stop(self) -> None:
+        """Write any queued events and release the writer connection."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # Flush the batch in progress and whatever is still queued
+        try:
+            while self._pending or not self._queue.empty():
+                await self._write_batch(self._take_batch())
+        except Exception as e:
+            logger.error(f"Failed to flush queued events: {e}")
+
+        if self._sync_conn:
+            await self._run_sync(self._close_sync)
+            self._sync_conn = None
+        if self._executor and self._owns_executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._conn:
+            await self._conn.close()
+            self._conn = None
+
+        logger.info("Event writer stopped")
+
+    def enqueue(
+        self,
+        event_type: str,
+        message: str,
+        level: str = "info",
+        component: Optional[str] = None,
+        session_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Queue an event for writing. Never blocks; drops the event if the queue is full."""
+        try:
+            self._queue.put_nowait({
+                "event_type": event_type,
+                "message": message,
+                "level": level,
+                "component": component,
+                "session_id": session_id,
+                "event_metadata": metadata or {}
+            })
+        except asyncio.QueueFull:
+            logger.warning(f"Event queue full, dropping event: {event_type}")
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        """Hand over the pending batch topped up from the queue without waiting."""
+        batch, self._pending = self._pending, []
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """Insert a batch of events and commit once."""
+        if not batch:
+            return
+        if self._sync_conn:
+            await self._run_sync(self._write_batch_sync, batch)
+        else:
+            await self._conn.execute(insert(SystemEvent), batch)
+            await self._conn.commit()
+
+    async def _rollback(self) -> None:
+        """Discard a failed batch's transaction."""
+        if self._sync_conn:
+            await self._run_sync(self._sync_conn.rollback)
+        elif self._conn:
+            await self._conn.rollback()
+
+    def _run_sync(self, fn, *args):
+        """Run fn on the writer thread, which owns the sqlite3 connection."""
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect_sync(self) -> Connection:
+        """Open the writer's own pysqlite connection to the database file."""
+        # Calls are awaited one at a time, but a shared pool may run them on
+        # different worker threads
+        sync_engine = create_engine(
+            self.engine.url.set(drivername="sqlite+pysqlite"),
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False},
+        )
+        event.listen(sync_engine, "connect", set_sqlite_pragmas)
+        return sync_engine.connect()
+
+    def _close_sync(self) -> None:
+        """Close the writer connection and its engine."""
+        self._sync_conn.close()
+        self._sync_conn.engine.dispose()
+
+    def _write_batch_sync(self, batch: List[Dict[str, Any]]) -> None:
+        """Insert and commit a batch on the writer thread."""
+        self._sync_conn.execute(insert(SystemEvent), batch)
+        self._sync_conn.commit()
+
+    async def _collect_batch(self) -> List[Dict[str, Any]]:
+        """Wait for an event, then gather more until the batch is full or flush_interval passes."""
+        self._pending.append(await self._queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(self._pending) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                self._pending.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return self._take_batch()
+
+    async def _run(self) -> None:
+        """Wait for events and write them in batches until cancelled."""
+        while True:
+            batch = await self._collect_batch()
+            try:
+                await self._write_batch(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} events: {e}")
+                try:
+                    await self._rollback()
+                except Exception:
+                    pass
+
+
+async def archive_events_by_day(engine: AsyncEngine, keep_days: int = 7) -> int:
+    """
+    Move events older than keep_days into per-day shard databases.
+
+    Each day goes to events_YYYYMMDD.db next to the main database. The shard
+    is ATTACHed, the rows are copied and then deleted from the main table,
+    and the shard is DETACHed, so the hot system_events table and its
+    indexes only hold the recent window. Returns the number of rows moved.
+    """
+    database = engine.url.database
+    if engine.url.get_backend_name() != "sqlite" or not database or database == ":memory:":
+        return 0
+
+    shard_dir = Path(database).resolve().parent
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=keep_days)).strftime("%Y-%m-%d")
+    moved = 0
+
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(text(
+                "SELECT DISTINCT substr(timestamp, 1, 10) FROM system_events "
+                "WHERE timestamp < :cutoff"
+            ), {"cutoff": cutoff})
+            days = [row[0] for row in result]
+            await conn.commit()
+
+            for day in days:
+                # Half-open range on the raw column so idx_event_timestamp is used
+                day_range = {
+                    "day": day,
+                    "next_day": (date.fromisoformat(day) + timedelta(days=1)).isoformat(),
+                }
+                shard_path = shard_dir / f"events_{day.replace('-', '')}.db"
+                # ATTACH is not allowed inside a transaction
+                await conn.execute(text("ATTACH DATABASE :path AS shard"), {"path": str(shard_path)})
+                try:
+                    await conn.execute(text(
+                        "CREATE TABLE IF NOT EXISTS shard.system_events AS "
+                        "SELECT * FROM main.system_events WHERE 0"
+                    ))
+                    result = await conn.execute(text(
+                        "INSERT INTO shard.system_events "
+                        "SELECT * FROM main.system_events "
+                        "WHERE timestamp >= :day AND timestamp < :next_day"
+                    ), day_range)
+                    await conn.execute(text(
+                        "DELETE FROM main.system_events "
+                        "WHERE timestamp >= :day AND timestamp < :next_day"
+                    ), day_range)
+                    await conn.commit()
+                    moved += result.rowcount
+                finally:
+                    # A failed copy leaves the shard locked by the open
+                    # transaction, which would make DETACH fail instead
+                    await conn.rollback()
+                    await conn.execute(text("DETACH DATABASE shard"))
+
+        if moved:
+            logger.info(f"Archived {moved} events into {len(days)} daily shards")
+        return moved
+
+    except Exception as e:
+        logger.error(f"Failed to archive events: {e}")
+        return moved
@@ -4,18 +4,32 @@ Uses SQLAlchemy ORM with async support and Pydantic for validation.
 """
 
 import asyncio
+import json
 import logging
+import weakref
+import zlib
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Annotated, Optional, List, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import (
     Column, Integer, String, Text, DateTime, Boolean, Float, JSON,
-    ForeignKey, Index, create_engine
+    ForeignKey, Index, FetchedValue, LargeBinary, TypeDecorator,
+    DDL, create_engine, event, inspect, text
 )
-from sqlalchemy.orm import relationship, selectinload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import column_property, deferred, relationship, selectinload
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.sql import func
-from pydantic import BaseModel, Field, field_validator
+from sqlalchemy.sql.expression import FunctionElement
+import msgpack
+from pydantic import (
+    BaseModel, ConfigDict, Field, StringConstraints, TypeAdapter, computed_field,
+    field_validator, model_validator
+)
 import aiosqlite
 
 logger = logging.getLogger(__name__)
@@ -23,42 +37,283 @@ logger = logging.getLogger(__name__)
 Base = declarative_base()
 
 
+class utcnow(FunctionElement):
+    """Current UTC time, evaluated by the database inside the statement.
+    
+    SQLite's CURRENT_TIMESTAMP has whole-second precision, so rows written
+    in the same second would tie on their timestamps; on SQLite this renders
+    with millisecond precision instead.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _compile_utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "sqlite")
+def _compile_utcnow_sqlite(element, compiler, **kw):
+    return "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# SQLite tuning applied to every new DBAPI connection. WAL lets readers run
+# alongside the writer and NORMAL sync drops an fsync per commit, which is
+# safe under WAL (only the last transactions can be lost on power failure).
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",  # 64MB page cache (negative = KiB)
+    "PRAGMA mmap_size=268435456",  # 256MB memory-mapped I/O
+    "PRAGMA busy_timeout=5000",  # Wait up to 5s instead of raising SQLITE_BUSY
+)
+
+
+class CompressedText(TypeDecorator):
+    """Text stored as a zlib-compressed BLOB.
+    
+    Rows written before the column was compressed come back from SQLite as
+    plain strings and are returned unchanged.
+    """
+    impl = LargeBinary
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(value.encode("utf-8"), 6)
+    
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        return zlib.decompress(value).decode("utf-8")
+
+
+class MsgpackDict(TypeDecorator):
+    """Dict stored as a msgpack-encoded BLOB.
+    
+    Smaller and cheaper to encode than JSON text for the write-heavy
+    metadata columns. Rows written while the column was JSON come back from
+    SQLite as strings and are decoded as JSON.
+    """
+    impl = LargeBinary
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return msgpack.packb(value, use_bin_type=True)
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return json.loads(value)
+        return msgpack.unpackb(value, raw=False)
+
+
 class Story(Base):
     """Story database model."""
     __tablename__ = "stories"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String(200), nullable=False)
-    content = Column(Text, nullable=False)
-    prompt = Column(Text, nullable=True)
-    summary = Column(Text, nullable=True)
+    # Large text columns are deferred so list queries only read the small
+    # columns; load them with .options(undefer_group("body")) when needed.
+    content = deferred(Column(Text, nullable=False), group="body")
+    prompt = deferred(Column(Text, nullable=True), group="body")
+    # Only read for display, never searched in SQL, so it can be compressed.
+    # content stays Text because search and the word count triggers use it.
+    summary = deferred(Column(CompressedText, nullable=True), group="body")
     language = Column(String(10), default="tr", nullable=False)
     age_rating = Column(String(20), default="5+", nullable=False)
-    word_count = Column(Integer, default=0)
-    estimated_duration = Column(Float, default=0.0)  # minutes
+    # Filled in by the stories_word_count_* triggers (see STORY_TRIGGERS)
+    word_count = Column(Integer, server_default=FetchedValue(), server_onupdate=FetchedValue())
+    estimated_duration = Column(Float, server_default=FetchedValue(), server_onupdate=FetchedValue())  # minutes
     themes = Column(JSON, default=list)  # List of themes
     characters = Column(JSON, default=list)  # List of characters
     safety_rating = Column(JSON, default=dict)  # Safety rating info
     provider_used = Column(String(50), nullable=True)  # LLM provider
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Timestamps are rendered as utcnow() inside the INSERT/UPDATE itself,
+    # so no Python datetime is built per row
+    created_at = Column(DateTime, default=utcnow(), nullable=False)
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
     is_favorite = Column(Boolean, default=False)
     play_count = Column(Integer, default=0)
     last_played = Column(DateTime, nullable=True)
     
     # Relationships
-    sessions = relationship("StorySession", back_populates="story")
+    # Never lazy-load sessions implicitly: in async code that is an extra
+    # await per story. Use .options(selectinload(Story.sessions)) instead.
+    sessions = relationship("StorySession", back_populates="story", lazy="raise")
     
     # Indexes
     __table_args__ = (
         Index('idx_story_language', 'language'),
         Index('idx_story_age_rating', 'age_rating'),
         Index('idx_story_created', 'created_at'),
-        Index('idx_story_favorite', 'is_favorite'),
         Index('idx_story_play_count', 'play_count'),
+        # Composite indexes serve both the filter and the ORDER BY of the
+        # common feed queries from one B-tree traversal (no temp sort).
+        Index('idx_story_fav_created', 'is_favorite', 'created_at'),
+        Index('idx_story_fav_played', 'is_favorite', 'last_played', 'created_at'),
+        Index('idx_story_lang_age_created', 'language', 'age_rating', 'created_at'),
+        # Trigram indexes let PostgreSQL answer search_stories' ILIKE
+        # '%query%' predicates from an index; SQLite keeps scanning.
+        *(
+            Index(
+                f'idx_story_{name}_trgm', name,
+                postgresql_using='gin', postgresql_ops={name: 'gin_trgm_ops'}
+            ).ddl_if(dialect='postgresql')
+            for name in ('title', 'content', 'prompt')
+        ),
     )
 
 
+class StoryTheme(Base):
+    """One row per story theme, kept in sync with Story.themes for indexed lookups."""
+    __tablename__ = "story_themes"
+    
+    story_id = Column(Integer, ForeignKey("stories.id"), primary_key=True)
+    theme = Column(String(100), primary_key=True)
+    
+    # Indexes
+    __table_args__ = (
+        Index('idx_story_theme_theme', 'theme', 'story_id'),
+    )
+
+
+def _story_theme_rows(story: Story) -> List[Dict[str, Any]]:
+    """Build story_themes rows for a story, dropping duplicates and blanks."""
+    themes = dict.fromkeys(theme for theme in (story.themes or []) if theme)
+    return [{"story_id": story.id, "theme": theme} for theme in themes]
+
+
+# gin_trgm_ops comes from the pg_trgm extension
+event.listen(
+    Base.metadata, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
+
+@event.listens_for(Story, "after_insert")
+def _insert_story_themes(mapper, connection, target) -> None:
+    """Populate story_themes when a story is created."""
+    rows = _story_theme_rows(target)
+    if rows:
+        connection.execute(StoryTheme.__table__.insert(), rows)
+
+
+@event.listens_for(Story, "after_update")
+def _update_story_themes(mapper, connection, target) -> None:
+    """Rebuild story_themes when a story's themes change."""
+    if not inspect(target).attrs.themes.history.has_changes():
+        return
+    table = StoryTheme.__table__
+    connection.execute(table.delete().where(table.c.story_id == target.id))
+    rows = _story_theme_rows(target)
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+@event.listens_for(Story, "after_delete")
+def _delete_story_themes(mapper, connection, target) -> None:
+    """Remove story_themes rows for a deleted story."""
+    table = StoryTheme.__table__
+    connection.execute(table.delete().where(table.c.story_id == target.id))
+
+
+# Word count and listening time are derived in SQLite from the stored content
+# rather than by splitting the text in Python. Tabs, line breaks and
+# non-breaking spaces are folded into spaces, the ends are trimmed and every
+# run of spaces is collapsed to one (via a char(1) marker), so the count
+# matches len(content.split()) for ordinary text. Duration uses the same
+# 80 words/minute pace as StoryGenerator.
+_FOLDED_CONTENT = "NEW.content"
+for _code in (9, 10, 11, 12, 13, 160):
+    _FOLDED_CONTENT = f"replace({_FOLDED_CONTENT}, char({_code}), ' ')"
+_NORMALIZED_CONTENT = (
+    f"replace(replace(replace(trim({_FOLDED_CONTENT}), ' ', ' ' || char(1)), "
+    "char(1) || ' ', ''), char(1), '')"
+)
+_WORD_COUNT_SQL = (
+    "(SELECT length(words) - length(replace(words, ' ', '')) + (words != '') "
+    f"FROM (SELECT {_NORMALIZED_CONTENT} AS words))"
+)
+# Duration reads the word_count just stored instead of recounting
+_SET_WORD_COUNT_SQL = (
+    f"UPDATE stories SET word_count = {_WORD_COUNT_SQL} WHERE id = NEW.id; "
+    "UPDATE stories SET estimated_duration = word_count / 80.0 WHERE id = NEW.id;"
+)
+
+# Without IF NOT EXISTS so the text matches what sqlite_master stores and
+# outdated definitions can be detected (see _create_story_triggers)
+STORY_TRIGGERS = {
+    "stories_word_count_insert": (
+        "CREATE TRIGGER stories_word_count_insert AFTER INSERT ON stories "
+        f"BEGIN {_SET_WORD_COUNT_SQL} END"
+    ),
+    "stories_word_count_update": (
+        "CREATE TRIGGER stories_word_count_update AFTER UPDATE OF content ON stories "
+        f"BEGIN {_SET_WORD_COUNT_SQL} END"
+    ),
+}
+
+
+# Only stories that were played can be popular; a partial index keeps the
+# never-played majority out of get_popular_stories' ordered scan.
+Index(
+    'idx_story_popular', Story.play_count.desc(), Story.created_at.desc(),
+    sqlite_where=Story.play_count > 0, postgresql_where=Story.play_count > 0
+)
+
+
+def story_search_vector():
+    """tsvector over a story's searchable text.
+    
+    search_stories must match against this exact expression for PostgreSQL
+    to use idx_story_search_tsv.
+    """
+    c = Story.__table__.c
+    document = func.coalesce(c.title, '') + ' ' + func.coalesce(c.content, '') + ' ' + func.coalesce(c.prompt, '')
+    # Literal config name so the index DDL and the query render identically
+    return func.to_tsvector(text("'simple'"), document)
+
+
+Index('idx_story_search_tsv', story_search_vector(), postgresql_using='gin').ddl_if(dialect='postgresql')
+
+# First theme of a story, indexed on SQLite only: json_extract is a SQLite
+# function, and PostgreSQL before 18 has no VIRTUAL generated columns, so it
+# is an expression index instead of a column. Queries must use this exact
+# expression (literal path, not a bound parameter) for SQLite to use it.
+story_theme_primary = func.json_extract(Story.__table__.c.themes, text("'$[0]'"))
+Story.theme_primary = column_property(story_theme_primary, deferred=True)
+Index('idx_story_theme_primary', story_theme_primary).ddl_if(dialect='sqlite')
+
+# SQLite counterpart: an external-content FTS5 index over the same columns,
+# kept current by triggers so the text is not stored twice.
+STORY_FTS_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS stories_fts USING fts5("
+    "title, content, prompt, content='stories', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+_FTS_DELETE_OLD = (
+    "INSERT INTO stories_fts(stories_fts, rowid, title, content, prompt) "
+    "VALUES ('delete', OLD.id, OLD.title, OLD.content, OLD.prompt);"
+)
+_FTS_INSERT_NEW = (
+    "INSERT INTO stories_fts(rowid, title, content, prompt) "
+    "VALUES (NEW.id, NEW.title, NEW.content, NEW.prompt);"
+)
+STORY_FTS_TRIGGERS = (
+    f"CREATE TRIGGER IF NOT EXISTS stories_fts_insert AFTER INSERT ON stories BEGIN {_FTS_INSERT_NEW} END",
+    f"CREATE TRIGGER IF NOT EXISTS stories_fts_delete AFTER DELETE ON stories BEGIN {_FTS_DELETE_OLD} END",
+    "CREATE TRIGGER IF NOT EXISTS stories_fts_update AFTER UPDATE OF title, content, prompt ON stories "
+    f"BEGIN {_FTS_DELETE_OLD} {_FTS_INSERT_NEW} END",
+)
+
+
 class StorySession(Base):
     """Story session/playback model."""
     __tablename__ = "story_sessions"
@@ -69,7 +324,7 @@ class StorySession(Base):
     prompt = Column(Text, nullable=False)
     language = Column(String(10), default="tr")
     age_rating = Column(String(20), default="5+")
-    start_time = Column(DateTime, default=datetime.utcnow, nullable=False)
+    start_time = Column(DateTime, default=utcnow(), nullable=False)
     end_time = Column(DateTime, nullable=True)
     duration = Column(Float, nullable=True)  # seconds
     paragraphs_generated = Column(Integer, default=0)
@@ -80,10 +335,13 @@ class StorySession(Base):
     llm_provider = Column(String(50), nullable=True)
     tts_provider = Column(String(50), nullable=True)
     error_message = Column(Text, nullable=True)
-    session_metadata = Column(JSON, default=dict)  # Additional session data
+    session_metadata = Column(MsgpackDict, default=dict)  # Additional session data
     
     # Relationships
-    story = relationship("Story", back_populates="sessions")
+    story = relationship("Story", back_populates="sessions", lazy="selectin")
+    
+    # Fetch id and SQL-side defaults with INSERT ... RETURNING
+    __mapper_args__ = {"eager_defaults": True}
     
     # Indexes
     __table_args__ = (
@@ -103,8 +361,8 @@ class UserPreferences(Base):
     value_type = Column(String(20), default="string")  # string, int, float, bool, json
     description = Column(Text, nullable=True)
     category = Column(String(50), default="general")
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow())
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
     
     # Indexes
     __table_args__ = (
@@ -122,23 +380,46 @@ class ScheduledStory(Base):
     story_id = Column(Integer, ForeignKey("stories.id"), nullable=True)
     prompt = Column(Text, nullable=True)  # Use if no specific story
     schedule_time = Column(String(10), nullable=False)  # HH:MM format
-    days_of_week = Column(JSON, default=list)  # [0-6] where 0=Monday
+    # Bit N set = enabled on weekday N (0=Monday); see days_to_mask()
+    days_mask = Column(Integer, nullable=False, default=0, server_default="0")
     is_enabled = Column(Boolean, default=True)
     language = Column(String(10), default="tr")
     age_rating = Column(String(20), default="5+")
     volume = Column(Float, default=0.7)  # 0.0 to 1.0
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow())
+    updated_at = Column(DateTime, default=utcnow(), onupdate=utcnow())
     last_triggered = Column(DateTime, nullable=True)
     
     # Relationships
-    story = relationship("Story")
+    story = relationship("Story", lazy="selectin")
+    
+    # Fetch id and SQL-side defaults with INSERT ... RETURNING
+    __mapper_args__ = {"eager_defaults": True}
     
     # Indexes
     __table_args__ = (
-        Index('idx_schedule_enabled', 'is_enabled'),
+        # Enabled schedules in time order, as get_active_schedules reads them
+        Index('idx_schedule_enabled_time', 'is_enabled', 'schedule_time'),
         Index('idx_schedule_time', 'schedule_time'),
     )
+    
+    @property
+    def days_of_week(self) -> List[int]:
+        """Enabled weekdays as a sorted list (0=Monday)."""
+        return mask_to_days(self.days_mask or 0)
+
+
+def days_to_mask(days: List[int]) -> int:
+    """Pack weekday numbers (0=Monday .. 6=Sunday) into a 7-bit mask."""
+    mask = 0
+    for day in days:
+        mask |= 1 << day
+    return mask
+
+
+def mask_to_days(mask: int) -> List[int]:
+    """Unpack a 7-bit weekday mask into a sorted list of weekday numbers."""
+    return [day for day in range(7) if mask & (1 << day)]
 
 
 class SystemEvent(Base):
@@ -151,8 +432,8 @@ class SystemEvent(Base):
     level = Column(String(20), default="info")  # debug, info, warning, error, critical
     component = Column(String(50), nullable=True)  # which component generated the event
     session_id = Column(String(50), nullable=True)  # related session if any
-    event_metadata = Column(JSON, default=dict)  # additional event data
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+    event_metadata = Column(MsgpackDict, default=dict)  # additional event data
+    timestamp = Column(DateTime, default=utcnow(), nullable=False)
     
     # Indexes
     __table_args__ = (
@@ -164,14 +445,20 @@ class SystemEvent(Base):
 
 # Pydantic models for validation and API responses
 
+# Shared constrained string types so each pattern is declared (and compiled
+# by pydantic-core) once instead of being repeated on every model field.
+LanguageCode = Annotated[str, StringConstraints(pattern=r"^(tr|en)$")]
+AgeRating = Annotated[str, StringConstraints(pattern=r"^\d+\+$")]
+ScheduleTime = Annotated[str, StringConstraints(pattern=r"^([01]?\d|2[0-3]):[0-5]\d$")]
+
 class StoryCreate(BaseModel):
     """Pydantic model for creating a new story."""
     title: str = Field(..., min_length=1, max_length=200)
     content: str = Field(..., min_length=10)
     prompt: Optional[str] = None
     summary: Optional[str] = None
-    language: str = Field(default="tr", pattern=r"^(tr|en)$")
-    age_rating: str = Field(default="5+", pattern=r"^\d+\+$")
+    language: LanguageCode = "tr"
+    age_rating: AgeRating = "5+"
     themes: List[str] = Field(default_factory=list)
     characters: List[str] = Field(default_factory=list)
     
@@ -183,6 +470,10 @@ class StoryCreate(BaseModel):
         return v
 
 
+# Validates a whole batch of stories in one pydantic-core call
+StoryCreateList = TypeAdapter(List[StoryCreate])
+
+
 class StoryUpdate(BaseModel):
     """Pydantic model for updating a story."""
     title: Optional[str] = Field(None, min_length=1, max_length=200)
@@ -193,13 +484,10 @@ class StoryUpdate(BaseModel):
     is_favorite: Optional[bool] = None
 
 
-class StoryResponse(BaseModel):
-    """Pydantic model for story API responses."""
+class StoryListResponse(BaseModel):
+    """Pydantic model for story list API responses (no story body)."""
     id: int
     title: str
-    content: str
-    prompt: Optional[str]
-    summary: Optional[str]
     language: str
     age_rating: str
     word_count: int
@@ -214,15 +502,25 @@ class StoryResponse(BaseModel):
     play_count: int
     last_played: Optional[datetime]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, defer_build=False)
+
+
+class StoryDetailResponse(StoryListResponse):
+    """Pydantic model for single story API responses."""
+    content: str
+    prompt: Optional[str]
+    summary: Optional[str]
+
+
+# Backwards-compatible name for the full story response
+StoryResponse = StoryDetailResponse
 
 
 class SessionCreate(BaseModel):
     """Pydantic model for creating a story session."""
     prompt: str = Field(..., min_length=1)
-    language: str = Field(default="tr", pattern=r"^(tr|en)$")
-    age_rating: str = Field(default="5+", pattern=r"^\d+\+$")
+    language: LanguageCode = "tr"
+    age_rating: AgeRating = "5+"
     wakeword_trigger: Optional[str] = None
 
 
@@ -246,8 +544,14 @@ class SessionResponse(BaseModel):
     tts_provider: Optional[str]
     error_message: Optional[str]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, defer_build=False)
+
+
+# Build the response validators/serializers once at import time so the first
+# API request does not pay for schema construction.
+StoryListResponse.model_rebuild(force=True)
+StoryDetailResponse.model_rebuild(force=True)
+SessionResponse.model_rebuild(force=True)
 
 
 class ScheduledStoryCreate(BaseModel):
@@ -255,10 +559,10 @@ class ScheduledStoryCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
     story_id: Optional[int] = None
     prompt: Optional[str] = None
-    schedule_time: str = Field(..., pattern=r"^([01]?\d|2[0-3]):[0-5]\d$")
-    days_of_week: List[int] = Field(..., min_items=1)
-    language: str = Field(default="tr", pattern=r"^(tr|en)$")
-    age_rating: str = Field(default="5+", pattern=r"^\d+\+$")
+    schedule_time: ScheduleTime
+    days_of_week: List[int] = Field(..., min_length=1)
+    language: LanguageCode = "tr"
+    age_rating: AgeRating = "5+"
     volume: float = Field(default=0.7, ge=0.0, le=1.0)
     
     @field_validator('days_of_week')
@@ -268,12 +572,17 @@ class ScheduledStoryCreate(BaseModel):
             raise ValueError("Days of week must be between 0-6")
         return sorted(list(set(v)))  # Remove duplicates and sort
     
-    @field_validator('story_id', 'prompt')
-    @classmethod
-    def validate_story_or_prompt(cls, v, values):
-        if not values.get('story_id') and not v:
+    @model_validator(mode='after')
+    def validate_story_or_prompt(self):
+        if not self.story_id and not self.prompt:
             raise ValueError("Either story_id or prompt must be provided")
-        return v
+        return self
+    
+    @computed_field
+    @property
+    def days_mask(self) -> int:
+        """days_of_week packed into the bitmask stored in the database."""
+        return days_to_mask(self.days_of_week)
 
 
 class UserPreferenceUpdate(BaseModel):
@@ -284,41 +593,175 @@ class UserPreferenceUpdate(BaseModel):
 
 # Database utility functions
 
+def set_sqlite_pragmas(dbapi_conn, _connection_record) -> None:
+    """Connect listener applying SQLITE_PRAGMAS to a new DBAPI connection."""
+    cursor = dbapi_conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
 async def create_database_engine(database_url: str):
     """Create async database engine."""
     try:
+        engine_kwargs: Dict[str, Any] = {
+            "pool_pre_ping": True,
+            "pool_recycle": 3600,  # Recycle connections after 1 hour
+        }
+        url = make_url(database_url)
+        if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+            # Keep a small pool of open connections so each session does not
+            # reopen the file and lose its page cache. In-memory databases keep
+            # SQLAlchemy's default StaticPool since every connection would
+            # otherwise see its own empty database. A local file connection
+            # cannot go stale, so skip the per-checkout ping and the hourly
+            # recycle that would throw the warm cache away.
+            engine_kwargs.update(
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=5,
+                max_overflow=10,
+                pool_pre_ping=False,
+                pool_recycle=-1,
+                connect_args={"check_same_thread": False},
+            )
+        
         # For SQLite with aiosqlite
         engine = create_async_engine(
             database_url,
             echo=False,  # Set to True for SQL debugging
-            pool_pre_ping=True,
-            pool_recycle=3600  # Recycle connections after 1 hour
+            **engine_kwargs
         )
+        
+        if database_url.startswith("sqlite"):
+            event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+        
         return engine
     except Exception as e:
         logger.error(f"Failed to create database engine: {e}")
         raise
 
 
+def _add_missing_columns(sync_conn) -> None:
+    """Add columns declared on models that an existing table lacks.
+    
+    Only covers additive changes (nullable columns), which is all SQLite's
+    ALTER TABLE ADD COLUMN supports.
+    """
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_ddl = CreateColumn(column).compile(dialect=sync_conn.dialect)
+            sync_conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}")
+            logger.info(f"Added column {table.name}.{column.name}")
+
+
+def _migrate_days_of_week(sync_conn) -> None:
+    """Fill days_mask from the legacy days_of_week JSON column if present."""
+    columns = {col["name"] for col in inspect(sync_conn).get_columns("scheduled_stories")}
+    if "days_of_week" not in columns:
+        return
+    sync_conn.exec_driver_sql(
+        "UPDATE scheduled_stories "
+        "SET days_mask = (SELECT coalesce(sum(1 << value), 0) FROM json_each(days_of_week)) "
+        "WHERE days_mask = 0 AND days_of_week IS NOT NULL"
+    )
+
+
+def _create_missing_indexes(sync_conn) -> None:
+    """Create indexes declared on existing tables that the database lacks."""
+    if sync_conn.dialect.name != "sqlite":
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(sync_conn, checkfirst=True)
+        return
+    # SQLite reflection skips expression indexes, so checkfirst cannot see them
+    existing = set(sync_conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'index'"
+    ).scalars())
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(sync_conn)
+
+
+def _create_story_triggers(sync_conn) -> None:
+    """Install the word count triggers, replacing outdated definitions.
+    
+    Stories counted by an older trigger are recounted once when it changes.
+    """
+    existing = dict(sync_conn.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'stories_word_count_%'"
+    ).all())
+    outdated = False
+    for name, trigger in STORY_TRIGGERS.items():
+        if existing.get(name) == trigger:
+            continue
+        if name in existing:
+            sync_conn.exec_driver_sql(f"DROP TRIGGER {name}")
+            outdated = True
+        sync_conn.exec_driver_sql(trigger)
+    if outdated:
+        sync_conn.exec_driver_sql("UPDATE stories SET content = content")
+
+
+def _create_story_fts(sync_conn) -> None:
+    """Create the SQLite story search index, filling it if it is new."""
+    exists = sync_conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stories_fts'"
+    ).first()
+    sync_conn.exec_driver_sql(STORY_FTS_TABLE)
+    for trigger in STORY_FTS_TRIGGERS:
+        sync_conn.exec_driver_sql(trigger)
+    if not exists:
+        sync_conn.exec_driver_sql("INSERT INTO stories_fts(stories_fts) VALUES ('rebuild')")
+
+
 async def create_tables(engine):
     """Create all database tables."""
     try:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            # create_all only builds columns and indexes together with new
+            # tables, so bring databases created by older versions up to date.
+            await conn.run_sync(_add_missing_columns)
+            await conn.run_sync(_create_missing_indexes)
+            await conn.run_sync(_migrate_days_of_week)
+            if conn.dialect.name == "sqlite":
+                await conn.run_sync(_create_story_triggers)
+                await conn.run_sync(_create_story_fts)
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Failed to create database tables: {e}")
         raise
 
 
+# One session factory per engine, dropped automatically when the engine is
+# garbage collected.
+_session_factories: "weakref.WeakKeyDictionary[Any, async_sessionmaker]" = weakref.WeakKeyDictionary()
+
+
+def get_session_factory(engine) -> async_sessionmaker:
+    """Get the cached session factory for an engine, creating it on first use."""
+    factory = _session_factories.get(engine)
+    if factory is None:
+        factory = async_sessionmaker(
+            engine,
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+        _session_factories[engine] = factory
+    return factory
+
+
 async def get_database_session(engine) -> AsyncSession:
     """Get database session."""
-    SessionLocal = async_sessionmaker(
-        engine,
-        class_=AsyncSession,
-        expire_on_commit=False
-    )
-    return SessionLocal()
+    return get_session_factory(engine)()
 
 
 async def init_default_preferences(session: AsyncSession):
@@ -390,19 +833,12 @@ async def init_default_preferences(session: AsyncSession):
     ]
     
     try:
-        from sqlalchemy import select
-        
-        for pref_data in default_preferences:
-            # Check if preference already exists
-            result = await session.execute(
-                select(UserPreferences).where(UserPreferences.key == pref_data["key"])
-            )
-            existing = result.scalar_one_or_none()
-            
-            if not existing:
-                preference = UserPreferences(**pref_data)
-                session.add(preference)
-        
+        # Bulk executemany INSERT (batched by SQLAlchemy under SQLite's bound
+        # parameter limit); the unique index on key skips existing preferences
+        await session.execute(
+            sqlite_insert(UserPreferences).on_conflict_do_nothing(index_elements=["key"]),
+            default_preferences
+        )
         await session.commit()
         logger.info("Default preferences initialized")
         
@@ -4,20 +4,56 @@ Provides async database operations for stories, sessions, and preferences.
 """
 
 import logging
-from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any, Tuple
+import re
+import time
+import uuid
+from datetime import timedelta
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple, Union
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_, desc, asc
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, update, delete, func, and_, or_, desc, asc, text, inspect, lambda_stmt, RowMapping
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import load_only, selectinload, undefer_group
+from sqlalchemy.orm.attributes import set_committed_value
 
 from .models import (
-    Story, StorySession, UserPreferences, ScheduledStory, SystemEvent,
-    StoryCreate, StoryUpdate, StoryResponse, SessionCreate, SessionResponse,
-    ScheduledStoryCreate, UserPreferenceUpdate
+    Story, StorySession, StoryTheme, UserPreferences, ScheduledStory, SystemEvent,
+    StoryCreate, StoryCreateList, StoryUpdate, StoryResponse, StoryListResponse, SessionCreate, SessionResponse,
+    ScheduledStoryCreate, UserPreferenceUpdate, story_search_vector, utcnow
 )
+from .event_writer import EventWriter
 
 logger = logging.getLogger(__name__)
 
+# Story columns filled in by the database; refreshing only these keeps the
+# deferred body columns already held in memory from being expired.
+STORY_GENERATED_FIELDS = ["word_count", "estimated_duration", "created_at", "updated_at"]
+
+# Deferred "body" group columns that get_story must return loaded
+STORY_BODY_FIELDS = ("content", "prompt", "summary")
+
+# Columns backing StoryListResponse, for Core selects that skip the ORM
+STORY_LIST_COLUMNS = tuple(getattr(Story, name) for name in StoryListResponse.model_fields)
+
+# Columns backing SessionResponse; session listings leave session_metadata unread
+SESSION_RESPONSE_COLUMNS = tuple(getattr(StorySession, name) for name in SessionResponse.model_fields)
+
+# Columns streamed for the web story list
+SESSION_LIST_COLUMNS = (
+    StorySession.session_id, StorySession.prompt, StorySession.language, StorySession.age_rating,
+    StorySession.status, StorySession.start_time, StorySession.end_time, StorySession.paragraphs_generated
+)
+
+# Queries made only of words go through the full-text index; anything else
+# (punctuation, wildcards) falls back to substring matching.
+WORD_QUERY_PATTERN = re.compile(r"[\w\s]+")
+
+# Seconds a preference value is served from memory before re-reading the DB
+PREFERENCE_CACHE_TTL = 30.0
+
+# Seconds the popular/recent/favorite story lists are served from memory
+STORY_LIST_CACHE_TTL = 30.0
+
 
 class StoryLibrary:
     """
@@ -25,8 +61,15 @@ class StoryLibrary:
     Handles stories, sessions, preferences, and system events.
     """
     
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, event_writer: Optional[EventWriter] = None):
         self.session = session
+        # When set, log_event queues events for batched writes instead of
+        # committing each one on the shared session
+        self.event_writer = event_writer
+        # key -> (monotonic time fetched, value); preferences are read-mostly
+        self._preference_cache: Dict[str, Tuple[float, Any]] = {}
+        # (list name, limit) -> (monotonic time fetched, stories); cleared on any story write
+        self._story_list_cache: Dict[Tuple[str, int], Tuple[float, List[Story]]] = {}
     
     # Story operations
     
@@ -35,11 +78,10 @@ class StoryLibrary:
         try:
             story_dict = story_data.dict()
             
-            # Add metadata if provided
+            # Add metadata if provided (word_count and estimated_duration are
+            # computed by the database from the content)
             if metadata:
                 story_dict.update({
-                    "word_count": metadata.get("word_count", 0),
-                    "estimated_duration": metadata.get("estimated_duration", 0.0),
                     "safety_rating": metadata.get("safety_rating", {}),
                     "provider_used": metadata.get("provider_used")
                 })
@@ -47,7 +89,8 @@ class StoryLibrary:
             story = Story(**story_dict)
             self.session.add(story)
             await self.session.commit()
-            await self.session.refresh(story)
+            self._story_list_cache.clear()
+            await self.session.refresh(story, STORY_GENERATED_FIELDS)
             
             logger.info(f"Created story: {story.id} - {story.title}")
             return story
@@ -60,10 +103,14 @@ class StoryLibrary:
     async def get_story(self, story_id: int) -> Optional[Story]:
         """Get a story by ID."""
         try:
-            result = await self.session.execute(
-                select(Story).where(Story.id == story_id)
-            )
-            return result.scalar_one_or_none()
+            # Identity map first; only a miss costs a SELECT
+            story = await self.session.get(Story, story_id, options=[undefer_group("body")])
+            if story is not None:
+                # A story already loaded by a list query lacks its deferred body
+                body_unloaded = [name for name in STORY_BODY_FIELDS if name in inspect(story).unloaded]
+                if body_unloaded:
+                    await self.session.refresh(story, body_unloaded)
+            return story
         except Exception as e:
             logger.error(f"Failed to get story {story_id}: {e}")
             return None
@@ -79,9 +126,9 @@ class StoryLibrary:
             for field, value in update_data.items():
                 setattr(story, field, value)
             
-            story.updated_at = datetime.utcnow()
             await self.session.commit()
-            await self.session.refresh(story)
+            self._story_list_cache.clear()
+            await self.session.refresh(story, STORY_GENERATED_FIELDS)
             
             logger.info(f"Updated story: {story.id}")
             return story
@@ -91,6 +138,48 @@ class StoryLibrary:
             await self.session.rollback()
             raise
     
+    async def import_stories(self, stories_data: Union[bytes, str, List[Dict[str, Any]]]) -> List[Story]:
+        """
+        Validate and create several stories in one transaction.
+        
+        Args:
+            stories_data: Raw JSON array (validated without an intermediate
+                json.loads) or a list of story dicts
+            
+        Returns:
+            List of created stories
+        """
+        try:
+            if isinstance(stories_data, (bytes, str)):
+                validated = StoryCreateList.validate_json(stories_data)
+            else:
+                validated = StoryCreateList.validate_python(stories_data)
+            
+            stories = [Story(**story_data.model_dump()) for story_data in validated]
+            self.session.add_all(stories)
+            await self.session.commit()
+            self._story_list_cache.clear()
+            
+            # Load the columns the database computed for the whole batch in
+            # one SELECT, without expiring anything else on the stories
+            by_id = {story.id: story for story in stories}
+            result = await self.session.execute(
+                select(Story.id, *(getattr(Story, name) for name in STORY_GENERATED_FIELDS))
+                .where(Story.id.in_(by_id))
+            )
+            for row in result:
+                story = by_id[row.id]
+                for name in STORY_GENERATED_FIELDS:
+                    set_committed_value(story, name, getattr(row, name))
+            
+            logger.info(f"Imported {len(stories)} stories")
+            return stories
+            
+        except Exception as e:
+            logger.error(f"Failed to import stories: {e}")
+            await self.session.rollback()
+            raise
+    
     async def delete_story(self, story_id: int) -> bool:
         """Delete a story."""
         try:
@@ -100,6 +189,7 @@ class StoryLibrary:
             
             await self.session.delete(story)
             await self.session.commit()
+            self._story_list_cache.clear()
             
             logger.info(f"Deleted story: {story_id}")
             return True
@@ -131,7 +221,9 @@ class StoryLibrary:
             # Build query
             query_filters = []
             
-            if query:
+            if query and WORD_QUERY_PATTERN.fullmatch(query) and query.strip():
+                query_filters.append(self._full_text_filter(query))
+            elif query:
                 # Search in title, content, and prompt
                 search_filter = or_(
                     Story.title.ilike(f"%{query}%"),
@@ -147,28 +239,20 @@ class StoryLibrary:
                 query_filters.append(Story.age_rating == age_rating)
             
             if themes:
-                # Search for stories containing any of the specified themes
-                theme_filters = []
-                for theme in themes:
-                    theme_filters.append(Story.themes.like(f'%"{theme}"%'))
-                query_filters.append(or_(*theme_filters))
+                # Stories with any of the themes, via idx_story_theme_theme
+                query_filters.append(Story.id.in_(
+                    select(StoryTheme.story_id).where(StoryTheme.theme.in_(themes))
+                ))
             
             if is_favorite is not None:
                 query_filters.append(Story.is_favorite == is_favorite)
             
-            # Build base query
-            base_query = select(Story)
+            # Page and total in one statement: the window count is computed
+            # over the filtered rows before OFFSET/LIMIT apply
+            base_query = select(Story, func.count().over().label("total_count"))
             if query_filters:
                 base_query = base_query.where(and_(*query_filters))
             
-            # Get total count
-            count_query = select(func.count(Story.id))
-            if query_filters:
-                count_query = count_query.where(and_(*query_filters))
-            
-            count_result = await self.session.execute(count_query)
-            total_count = count_result.scalar()
-            
             # Apply sorting
             sort_column = getattr(Story, sort_by, Story.created_at)
             if sort_order.lower() == "desc":
@@ -181,7 +265,19 @@ class StoryLibrary:
             
             # Execute query
             result = await self.session.execute(base_query)
-            stories = result.scalars().all()
+            rows = result.all()
+            stories = [row[0] for row in rows]
+            
+            if rows:
+                total_count = rows[0].total_count
+            elif offset:
+                # Paged past the end; the total still needs its own count
+                count_query = select(func.count(Story.id))
+                if query_filters:
+                    count_query = count_query.where(and_(*query_filters))
+                total_count = (await self.session.execute(count_query)).scalar()
+            else:
+                total_count = 0
             
             return stories, total_count
             
@@ -189,35 +285,105 @@ class StoryLibrary:
             logger.error(f"Failed to search stories: {e}")
             return [], 0
     
+    def _full_text_filter(self, query: str):
+        """Word search against the dialect's full-text index."""
+        if self.session.bind.dialect.name == "postgresql":
+            return story_search_vector().op("@@")(func.plainto_tsquery("simple", query))
+        
+        # FTS5 prefix terms, each quoted so user input is never parsed as syntax
+        match = " ".join('"{}"*'.format(word.replace('"', '""')) for word in query.split())
+        return Story.id.in_(
+            select(text("rowid"))
+            .select_from(text("stories_fts"))
+            .where(text("stories_fts MATCH :match").bindparams(match=match))
+        )
+    
+    async def list_stories(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        is_favorite: Optional[bool] = None
+    ) -> List[StoryListResponse]:
+        """
+        List stories newest first for read-only views.
+        
+        Selects only the list columns and validates the raw rows directly,
+        skipping ORM object construction and identity-map bookkeeping.
+        """
+        try:
+            query = select(*STORY_LIST_COLUMNS)
+            if is_favorite is not None:
+                query = query.where(Story.is_favorite == is_favorite)
+            query = query.order_by(desc(Story.created_at), desc(Story.id)).offset(offset).limit(limit)
+            
+            result = await self.session.execute(query)
+            return [StoryListResponse.model_validate(row._mapping) for row in result]
+        except Exception as e:
+            logger.error(f"Failed to list stories: {e}")
+            return []
+    
+    async def iter_stories(
+        self,
+        language: Optional[str] = None,
+        batch_size: int = 100
+    ) -> AsyncIterator[Story]:
+        """
+        Stream full stories in id order for exports and bulk processing.
+        
+        Rows are fetched batch_size at a time from a server-side cursor, so
+        memory stays bounded however large the library grows.
+        """
+        query = select(Story).options(undefer_group("body")).order_by(Story.id)
+        if language:
+            query = query.where(Story.language == language)
+        
+        result = await self.session.stream_scalars(query.execution_options(yield_per=batch_size))
+        async for story in result:
+            yield story
+    
     async def get_popular_stories(self, limit: int = 10) -> List[Story]:
         """Get most popular stories by play count."""
+        cached = self._get_cached_story_list("popular", limit)
+        if cached is not None:
+            return cached
+        
         try:
-            result = await self.session.execute(
-                select(Story)
+            result = await self.session.execute(lambda_stmt(
+                lambda: select(Story)
                 .where(Story.play_count > 0)
                 .order_by(desc(Story.play_count), desc(Story.created_at))
                 .limit(limit)
-            )
-            return result.scalars().all()
+            ))
+            stories = result.scalars().all()
+            self._story_list_cache[("popular", limit)] = (time.monotonic(), stories)
+            return stories
         except Exception as e:
             logger.error(f"Failed to get popular stories: {e}")
             return []
     
     async def get_recent_stories(self, limit: int = 10) -> List[Story]:
         """Get most recently created stories."""
+        cached = self._get_cached_story_list("recent", limit)
+        if cached is not None:
+            return cached
+        
         try:
-            result = await self.session.execute(
-                select(Story)
-                .order_by(desc(Story.created_at))
-                .limit(limit)
-            )
-            return result.scalars().all()
+            result = await self.session.execute(lambda_stmt(
+                lambda: select(Story).order_by(desc(Story.created_at), desc(Story.id)).limit(limit)
+            ))
+            stories = result.scalars().all()
+            self._story_list_cache[("recent", limit)] = (time.monotonic(), stories)
+            return stories
         except Exception as e:
             logger.error(f"Failed to get recent stories: {e}")
             return []
     
     async def get_favorite_stories(self, limit: int = 50) -> List[Story]:
         """Get favorite stories."""
+        cached = self._get_cached_story_list("favorite", limit)
+        if cached is not None:
+            return cached
+        
         try:
             result = await self.session.execute(
                 select(Story)
@@ -225,35 +391,46 @@ class StoryLibrary:
                 .order_by(desc(Story.last_played), desc(Story.created_at))
                 .limit(limit)
             )
-            return result.scalars().all()
+            stories = result.scalars().all()
+            self._story_list_cache[("favorite", limit)] = (time.monotonic(), stories)
+            return stories
         except Exception as e:
             logger.error(f"Failed to get favorite stories: {e}")
             return []
     
+    def _get_cached_story_list(self, name: str, limit: int) -> Optional[List[Story]]:
+        """Return a cached story list if it is younger than STORY_LIST_CACHE_TTL."""
+        cached = self._story_list_cache.get((name, limit))
+        if cached is not None and time.monotonic() - cached[0] < STORY_LIST_CACHE_TTL:
+            return cached[1]
+        return None
+    
     async def increment_play_count(self, story_id: int) -> None:
         """Increment play count and update last played time."""
         try:
-            story = await self.get_story(story_id)
-            if story:
-                story.play_count += 1
-                story.last_played = datetime.utcnow()
-                await self.session.commit()
+            # Increment in SQL so concurrent plays cannot overwrite each other
+            await self.session.execute(
+                update(Story)
+                .where(Story.id == story_id)
+                .values(play_count=Story.play_count + 1, last_played=utcnow())
+            )
+            await self.session.commit()
+            self._story_list_cache.clear()
         except Exception as e:
             logger.error(f"Failed to increment play count for story {story_id}: {e}")
+            await self.session.rollback()
     
     # Session operations
     
     async def create_session(self, session_data: SessionCreate) -> StorySession:
         """Create a new story session."""
         try:
-            import time
             session_dict = session_data.dict()
-            session_dict["session_id"] = f"session_{int(time.time())}"
+            session_dict["session_id"] = f"session_{uuid.uuid4().hex}"
             
             session = StorySession(**session_dict)
             self.session.add(session)
             await self.session.commit()
-            await self.session.refresh(session)
             
             logger.info(f"Created session: {session.session_id}")
             return session
@@ -290,28 +467,48 @@ class StoryLibrary:
     async def complete_session(self, session_id: str, story_id: Optional[int] = None) -> None:
         """Mark a session as completed."""
         try:
+            # Timestamps come from the database clock, like the column defaults
             updates = {
                 "status": "completed",
-                "end_time": datetime.utcnow()
+                "end_time": utcnow(),
+                "duration": self._seconds_since_start()
             }
             if story_id:
                 updates["story_id"] = story_id
             
-            session = await self.update_session(session_id, **updates)
-            if session and session.end_time and session.start_time:
-                duration = (session.end_time - session.start_time).total_seconds()
-                await self.update_session(session_id, duration=duration)
+            await self.session.execute(
+                update(StorySession)
+                .where(StorySession.session_id == session_id)
+                .values(**updates)
+            )
+            await self.session.commit()
                 
         except Exception as e:
             logger.error(f"Failed to complete session {session_id}: {e}")
+            await self.session.rollback()
+    
+    def _seconds_since_start(self):
+        """SQL expression for the seconds between a session's start_time and now."""
+        if self.session.bind.dialect.name == "postgresql":
+            return func.extract("epoch", func.now() - StorySession.start_time)
+        return (func.julianday("now") - func.julianday(StorySession.start_time)) * 86400.0
+    
+    def _days_ago(self, days: int):
+        """SQL expression for the database's current time minus a number of days."""
+        if self.session.bind.dialect.name == "postgresql":
+            return func.now() - timedelta(days=days)
+        return func.datetime("now", f"-{int(days)} days")
     
     async def get_recent_sessions(self, limit: int = 20, offset: int = 0) -> List[StorySession]:
         """Get recent story sessions."""
         try:
             result = await self.session.execute(
                 select(StorySession)
-                .options(selectinload(StorySession.story))
-                .order_by(desc(StorySession.start_time))
+                .options(
+                    load_only(*SESSION_RESPONSE_COLUMNS),
+                    selectinload(StorySession.story).load_only(*STORY_LIST_COLUMNS)
+                )
+                .order_by(desc(StorySession.start_time), desc(StorySession.id))
                 .offset(offset)
                 .limit(limit)
             )
@@ -320,53 +517,50 @@ class StoryLibrary:
             logger.error(f"Failed to get recent sessions: {e}")
             return []
     
+    async def iter_recent_sessions(
+        self,
+        limit: int = 20,
+        offset: int = 0,
+        batch_size: int = 100
+    ) -> AsyncIterator[RowMapping]:
+        """
+        Stream recent sessions newest first as plain row mappings.
+        
+        Only the list columns are selected and rows are fetched batch_size at
+        a time, so callers can encode each row as it arrives instead of
+        holding the whole page of ORM objects.
+        """
+        query = (
+            select(*SESSION_LIST_COLUMNS)
+            .order_by(desc(StorySession.start_time), desc(StorySession.id))
+            .offset(offset)
+            .limit(limit)
+        )
+        
+        result = await self.session.stream(query.execution_options(yield_per=batch_size))
+        async for row in result.mappings():
+            yield row
+    
     async def get_session_stats(self, days: int = 30) -> Dict[str, Any]:
         """Get session statistics for the last N days."""
         try:
-            since_date = datetime.utcnow() - timedelta(days=days)
+            since_date = self._days_ago(days)
             
-            # Total sessions
-            total_result = await self.session.execute(
-                select(func.count(StorySession.id))
-                .where(StorySession.start_time >= since_date)
-            )
-            total_sessions = total_result.scalar()
-            
-            # Completed sessions
-            completed_result = await self.session.execute(
-                select(func.count(StorySession.id))
-                .where(
-                    and_(
-                        StorySession.start_time >= since_date,
-                        StorySession.status == "completed"
-                    )
-                )
-            )
-            completed_sessions = completed_result.scalar()
-            
-            # Average duration
-            duration_result = await self.session.execute(
-                select(func.avg(StorySession.duration))
-                .where(
-                    and_(
-                        StorySession.start_time >= since_date,
-                        StorySession.duration.isnot(None)
-                    )
-                )
-            )
-            avg_duration = duration_result.scalar() or 0
-            
-            # Wake word triggers
-            wakeword_result = await self.session.execute(
-                select(func.count(StorySession.id))
-                .where(
-                    and_(
-                        StorySession.start_time >= since_date,
-                        StorySession.wakeword_trigger.isnot(None)
-                    )
+            # One pass over the window with conditional aggregates
+            result = await self.session.execute(
+                select(
+                    func.count(StorySession.id).label("total"),
+                    func.count(StorySession.id).filter(StorySession.status == "completed").label("completed"),
+                    func.avg(StorySession.duration).label("avg_duration"),
+                    func.count(StorySession.id).filter(StorySession.wakeword_trigger.isnot(None)).label("wakeword")
                 )
+                .where(StorySession.start_time >= since_date)
             )
-            wakeword_sessions = wakeword_result.scalar()
+            stats = result.one()
+            total_sessions = stats.total
+            completed_sessions = stats.completed
+            avg_duration = stats.avg_duration or 0
+            wakeword_sessions = stats.wakeword
             
             return {
                 "days": days,
@@ -385,44 +579,47 @@ class StoryLibrary:
     # User preferences
     
     async def get_preference(self, key: str) -> Optional[Any]:
-        """Get a user preference value."""
+        """Get a user preference value (cached for PREFERENCE_CACHE_TTL seconds)."""
+        cached = self._preference_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < PREFERENCE_CACHE_TTL:
+            return cached[1]
+        
         try:
-            result = await self.session.execute(
-                select(UserPreferences).where(UserPreferences.key == key)
-            )
-            pref = result.scalar_one_or_none()
-            return pref.value if pref else None
+            result = await self.session.execute(lambda_stmt(
+                lambda: select(UserPreferences.value).where(UserPreferences.key == key).limit(1)
+            ))
+            value = result.scalar_one_or_none()
+            self._preference_cache[key] = (time.monotonic(), value)
+            return value
         except Exception as e:
             logger.error(f"Failed to get preference {key}: {e}")
             return None
     
     async def set_preference(self, key: str, value: Any, description: Optional[str] = None) -> None:
         """Set a user preference."""
+        self._preference_cache.pop(key, None)
         try:
-            result = await self.session.execute(
-                select(UserPreferences).where(UserPreferences.key == key)
+            # Determine value type
+            value_type = type(value).__name__
+            if value_type == "list" or value_type == "dict":
+                value_type = "json"
+            
+            # Single atomic upsert; an existing row keeps its type and,
+            # unless a new one is given, its description
+            dialect_insert = postgresql_insert if self.session.bind.dialect.name == "postgresql" else sqlite_insert
+            stmt = dialect_insert(UserPreferences).values(
+                key=key,
+                value=value,
+                value_type=value_type,
+                description=description or f"User preference: {key}"
             )
-            pref = result.scalar_one_or_none()
-            
-            if pref:
-                pref.value = value
-                pref.updated_at = datetime.utcnow()
-                if description:
-                    pref.description = description
-            else:
-                # Determine value type
-                value_type = type(value).__name__
-                if value_type == "list" or value_type == "dict":
-                    value_type = "json"
-                
-                pref = UserPreferences(
-                    key=key,
-                    value=value,
-                    value_type=value_type,
-                    description=description or f"User preference: {key}"
-                )
-                self.session.add(pref)
+            update_values = {"value": stmt.excluded.value, "updated_at": utcnow()}
+            if description:
+                update_values["description"] = stmt.excluded.description
             
+            await self.session.execute(
+                stmt.on_conflict_do_update(index_elements=[UserPreferences.key], set_=update_values)
+            )
             await self.session.commit()
             
         except Exception as e:
@@ -447,10 +644,9 @@ class StoryLibrary:
     async def create_scheduled_story(self, schedule_data: ScheduledStoryCreate) -> ScheduledStory:
         """Create a new scheduled story."""
         try:
-            schedule = ScheduledStory(**schedule_data.dict())
+            schedule = ScheduledStory(**schedule_data.dict(exclude={"days_of_week"}))
             self.session.add(schedule)
             await self.session.commit()
-            await self.session.refresh(schedule)
             
             logger.info(f"Created scheduled story: {schedule.id} - {schedule.name}")
             return schedule
@@ -460,15 +656,25 @@ class StoryLibrary:
             await self.session.rollback()
             raise
     
-    async def get_active_schedules(self) -> List[ScheduledStory]:
-        """Get all active scheduled stories."""
+    async def get_active_schedules(self, weekday: Optional[int] = None) -> List[ScheduledStory]:
+        """
+        Get all active scheduled stories.
+        
+        Args:
+            weekday: Only return schedules enabled on this day (0=Monday)
+        """
         try:
-            result = await self.session.execute(
-                select(ScheduledStory)
+            query = lambda_stmt(
+                lambda: select(ScheduledStory)
                 .where(ScheduledStory.is_enabled == True)
-                .options(selectinload(ScheduledStory.story))
+                .options(selectinload(ScheduledStory.story).load_only(*STORY_LIST_COLUMNS))
                 .order_by(ScheduledStory.schedule_time)
             )
+            if weekday is not None:
+                day_bit = 1 << weekday
+                query += lambda q: q.where(ScheduledStory.days_mask.op("&")(day_bit) != 0)
+            
+            result = await self.session.execute(query)
             return result.scalars().all()
         except Exception as e:
             logger.error(f"Failed to get active schedules: {e}")
@@ -477,17 +683,16 @@ class StoryLibrary:
     async def update_schedule_trigger(self, schedule_id: int) -> None:
         """Update the last triggered time for a schedule."""
         try:
-            result = await self.session.execute(
-                select(ScheduledStory).where(ScheduledStory.id == schedule_id)
+            await self.session.execute(
+                update(ScheduledStory)
+                .where(ScheduledStory.id == schedule_id)
+                .values(last_triggered=utcnow())
             )
-            schedule = result.scalar_one_or_none()
-            
-            if schedule:
-                schedule.last_triggered = datetime.utcnow()
-                await self.session.commit()
+            await self.session.commit()
                 
         except Exception as e:
             logger.error(f"Failed to update schedule trigger {schedule_id}: {e}")
+            await self.session.rollback()
     
     # System events
     
@@ -501,6 +706,10 @@ class StoryLibrary:
         metadata: Optional[Dict[str, Any]] = None
     ) -> None:
         """Log a system event."""
+        if self.event_writer and self.event_writer.is_running:
+            self.event_writer.enqueue(event_type, message, level, component, session_id, metadata)
+            return
+
         try:
             event = SystemEvent(
                 event_type=event_type,
@@ -508,7 +717,7 @@ class StoryLibrary:
                 level=level,
                 component=component,
                 session_id=session_id,
-                metadata=metadata or {}
+                event_metadata=metadata or {}
             )
             self.session.add(event)
 
@@ -532,7 +741,7 @@ class StoryLibrary:
     async def get_recent_events(self, limit: int = 100, level: Optional[str] = None) -> List[SystemEvent]:
         """Get recent system events."""
         try:
-            query = select(SystemEvent).order_by(desc(SystemEvent.timestamp)).limit(limit)
+            query = select(SystemEvent).order_by(desc(SystemEvent.timestamp), desc(SystemEvent.id)).limit(limit)
             
             if level:
                 query = query.where(SystemEvent.level == level)
@@ -547,19 +756,17 @@ class StoryLibrary:
     async def cleanup_old_events(self, days: int = 30) -> int:
         """Clean up old system events."""
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
+            cutoff_date = self._days_ago(days)
             
+            # Range delete on idx_event_timestamp; no rows are loaded
             result = await self.session.execute(
-                select(func.count(SystemEvent.id))
-                .where(SystemEvent.timestamp < cutoff_date)
+                delete(SystemEvent).where(SystemEvent.timestamp < cutoff_date),
+                execution_options={"synchronize_session": False}
             )
-            count = result.scalar()
+            await self.session.commit()
             
+            count = result.rowcount
             if count > 0:
-                await self.session.execute(
-                    select(SystemEvent).where(SystemEvent.timestamp < cutoff_date)
-                )
-                await self.session.commit()
                 logger.info(f"Cleaned up {count} old events")
             
             return count
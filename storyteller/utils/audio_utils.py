@@ -21,12 +21,10 @@ def calculate_audio_duration(audio_data: bytes, sample_rate: int, channels: int
     Returns:
         float: Duration in seconds
     """
-    try:
-        total_samples = len(audio_data) // (channels * sample_width)
-        duration = total_samples / sample_rate
-        return duration
-    except ZeroDivisionError:
+    frame_size = channels * sample_width
+    if frame_size == 0 or sample_rate == 0:
         return 0.0
+    return (len(audio_data) // frame_size) / sample_rate
 
 
 def validate_audio_format(audio_data: bytes, expected_format: str = "pcm_16") -> bool:
@@ -34,26 +32,14 @@ def validate_audio_format(audio_data: bytes, expected_format: str = "pcm_16") ->
     Validate audio data format.
     
     Args:
-        audio_data: Raw audio data
+        audio_data: Raw audio data (bytes, bytearray or memoryview)
         expected_format: Expected audio format
-        
+
     Returns:
         bool: True if format is valid
     """
-    try:
-        if not audio_data:
-            return False
-        
-        # Basic validation - check if data length is reasonable
-        if len(audio_data) < 100:  # Too short
-            return False
-        
-        # For PCM 16-bit, data length should be even
-        if expected_format == "pcm_16" and len(audio_data) % 2 != 0:
-            return False
-        
-        return True
-        
-    except Exception as e:
-        logger.warning(f"Audio format validation failed: {e}")
-        return False
\ No newline at end of file
+    n = len(audio_data)
+    # Long enough to be real audio; PCM 16-bit must also be whole samples
+    if expected_format == "pcm_16":
+        return n >= 100 and not n & 1
+    return n >= 100
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""
+Event loop selection for the storyteller entry points.
+Runs on uvloop when it is installed, falling back to the default asyncio loop.
+"""
+
+import asyncio
+import logging
+from typing import Any, Coroutine, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def run_async(main: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine to completion on a fresh event loop.
+
+    uvloop is used when available; it dispatches callbacks and socket I/O
+    noticeably faster than the default selector loop.
+
+    Args:
+        main: Coroutine to run
+
+    Returns:
+        The coroutine's result
+    """
+    try:
+        import uvloop
+    except ImportError:
+        logger.debug("uvloop not available, using the default asyncio event loop")
+        return asyncio.run(main)
+
+    return uvloop.run(main)
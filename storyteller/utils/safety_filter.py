@@ -5,13 +5,191 @@ Ensures all story content is suitable for the target child audience.
 
 import logging
 import re
-from typing import List, Dict, Any, Optional
+import sys
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
+from functools import lru_cache
+
+import ahocorasick
 
 logger = logging.getLogger(__name__)
 
+# Word patterns that might be problematic, one named group per theme so a
+# single scan reports which theme matched
+PROBLEMATIC_PATTERN = re.compile(
+    r'\b(?:'
+    r'(?P<death>öl\w+|die\w*)'  # Death-related words
+    r'|(?P<fear>korku\w+|fear\w*)'  # Fear-related words
+    r'|(?P<war>savaş\w+|war\w*)'  # War-related words
+    r'|(?P<blood>kan\w*|blood\w*)'  # Blood-related words
+    r'|(?P<pain>acı\w*|pain\w*)'  # Pain-related words
+    r')\b'
+)
+
+# Runs of whitespace left behind after removing words
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Forbidden words and concepts (Turkish and English)
+FORBIDDEN_WORDS = {
+    "violence": (
+        # Turkish
+        "şiddet", "kavga", "dövüş", "savaş", "vurmak", "öldürmek", "yaralamak",
+        "silah", "bıçak", "tabanca", "kan", "acı", "ağlamak", "korku", "korkunç",
+        "canavar", "ejder", "hayalet", "zombi", "ölüm", "ölmek", "cehennem",
+        # English
+        "violence", "fight", "war", "kill", "murder", "hurt", "weapon", "gun",
+        "knife", "blood", "pain", "cry", "fear", "scary", "monster", "dragon",
+        "ghost", "zombie", "death", "die", "hell"
+    ),
+    "inappropriate": (
+        # Turkish
+        "alkol", "sigara", "uyuşturucu", "kumar", "para", "zengin", "fakir",
+        "ayrılık", "boşanmak", "kavga", "kızgın", "sinirli", "stres",
+        # English  
+        "alcohol", "cigarette", "drugs", "gambling", "money", "rich", "poor",
+        "divorce", "separation", "angry", "stress", "adult"
+    ),
+    "complex_emotions": (
+        # Turkish
+        "depresyon", "kaygı", "endişe", "üzüntü", "yalnızlık", "kıskançlık",
+        "nefret", "öfke", "intikam", "suçluluk",
+        # English
+        "depression", "anxiety", "worry", "sadness", "loneliness", "jealousy",
+        "hate", "anger", "revenge", "guilt"
+    )
+}
+
+# Positive replacement concepts
+POSITIVE_REPLACEMENTS = {
+    "fight": "oyun oyna",  # "play games"
+    "scary": "eğlenceli",  # "fun"
+    "monster": "sevimli hayvan",  # "cute animal"
+    "dark": "gece",  # "night"
+    "lost": "maceraya çık",  # "go on adventure"
+    "sad": "düşünceli",  # "thoughtful"
+    "angry": "biraz üzgün",  # "a little sad"
+    "kill": "uyut",  # "put to sleep"
+    "dead": "uyuyor",  # "sleeping"
+    "war": "yarışma",  # "competition"
+    "weapon": "sihirli değnek"  # "magic wand"
+}
+
+# Age-appropriate themes to encourage
+POSITIVE_THEMES = (
+    "dostluk", "yardımlaşma", "sevgi", "aile", "doğa", "hayvanlar",
+    "macera", "keşif", "öğrenme", "büyüme", "hayal kurma", "oyun",
+    "müzik", "sanat", "rengarenk", "güzellik", "mutluluk", "gülmek",
+    "friendship", "helping", "love", "family", "nature", "animals",
+    "adventure", "discovery", "learning", "growing", "imagination", "play",
+    "music", "art", "colorful", "beauty", "happiness", "laughing"
+)
+
+
+@lru_cache(maxsize=1)
+def _build_forbidden_automaton() -> ahocorasick.Automaton:
+    """
+    Build the shared Aho-Corasick automaton over FORBIDDEN_WORDS.
+    
+    It finds every listed word in one pass over the text. A word listed
+    under several categories maps to all of them, and each word carries
+    its positive replacement, if any.
+    """
+    word_entries: Dict[str, List[Tuple[str, str]]] = {}
+    for category, words in FORBIDDEN_WORDS.items():
+        for word in words:
+            word_entries.setdefault(word.lower(), []).append((category, word))
+    automaton = ahocorasick.Automaton()
+    for key, entries in word_entries.items():
+        automaton.add_word(key, (key, entries, POSITIVE_REPLACEMENTS.get(key)))
+    automaton.make_automaton()
+    return automaton
+
+
+@lru_cache(maxsize=1)
+def _build_positive_theme_automaton() -> ahocorasick.Automaton:
+    """Build the shared Aho-Corasick automaton over POSITIVE_THEMES."""
+    automaton = ahocorasick.Automaton()
+    for theme in POSITIVE_THEMES:
+        automaton.add_word(theme.lower(), theme)
+    automaton.make_automaton()
+    return automaton
+
+
+def _lower_keep_offsets(text: str) -> str:
+    """Lower-case text without changing its length, so offsets map back to the original."""
+    text_lower = text.lower()
+    if len(text_lower) == len(text):
+        return text_lower
+    # Characters such as 'İ' grow when lower-cased; leave those as they are
+    return ''.join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
 
-@dataclass
+def _is_whole_word(text: str, start: int, end: int) -> bool:
+    """Whether text[start:end] is bounded by non-word characters, like a regex \\b."""
+    before = text[start - 1] if start > 0 else ' '
+    after = text[end] if end < len(text) else ' '
+    return not (before.isalnum() or before == '_') and not (after.isalnum() or after == '_')
+
+
+# Safety instructions wrapped around every prompt, per language. Only the
+# target age is filled in here; the prompt goes where {prompt} stands.
+SAFETY_PROMPT_TEMPLATES = {
+    "tr": """
+{target_age} yaşındaki bir çocuk için güvenli ve yaşına uygun bir uyku masalı oluştur.
+Hikaye şunları içermeli:
+- Sevgi dolu ve pozitif karakterler
+- Güvenli ve rahatlatıcı ortamlar  
+- Eğitici ve olumlu mesajlar
+- Huzur verici bir son
+
+Hikaye şunları içermemeli:
+- Şiddet, korku veya üzücü içerik
+- Karmaşık duygusal durumlar
+- Yetişkin konuları
+- Korkutucu karakterler veya durumlar
+
+Hikaye konusu: {prompt}
+
+Lütfen nazik, sevecen bir dille, uyku öncesi için uygun sakinleştirici bir hikaye yaz.
+""",
+    "en": """
+Create a safe and age-appropriate bedtime story for a {target_age}-year-old child.
+The story should include:
+- Loving and positive characters
+- Safe and comforting environments
+- Educational and positive messages
+- A peaceful ending
+
+The story should NOT include:
+- Violence, fear, or sad content
+- Complex emotional situations
+- Adult topics
+- Scary characters or situations
+
+Story topic: {prompt}
+
+Please write a gentle, loving story suitable for bedtime in a soothing tone.
+""",
+}
+
+# Fallback prompts used when filtering fails
+DEFAULT_SAFE_PROMPTS = {
+    "tr": """
+5 yaşındaki bir çocuk için güvenli bir uyku masalı oluştur.
+Hikaye sevimli hayvanlar, dostluk ve sevgi hakkında olsun.
+Rahatlatıcı ve huzur verici bir hikaye anlat.
+""",
+    "en": """
+Create a safe bedtime story for a 5-year-old child.
+The story should be about cute animals, friendship, and love.
+Tell a soothing and peaceful story.
+""",
+}
+
+
+# Slotted dataclasses need Python 3.10; a hand-written __slots__ would clash
+# with the suggested_replacement default
+@dataclass(**({"slots": True} if sys.version_info >= (3, 10) else {}))
 class SafetyViolation:
     """Information about a content safety violation."""
     category: str
@@ -33,73 +211,21 @@ class SafetyFilter:
         
         # Initialize filtering rules
         self._init_filtering_rules()
+        
+        # Build the prompt templates once; only the prompt varies per call
+        template_language = "tr" if language == "tr" else "en"
+        template = SAFETY_PROMPT_TEMPLATES[template_language].replace("{target_age}", str(target_age))
+        self._safety_prefix_head, self._safety_prefix_tail = template.split("{prompt}")
+        self._default_safe_prompt = DEFAULT_SAFE_PROMPTS[template_language]
     
     def _init_filtering_rules(self) -> None:
         """Initialize content filtering rules."""
-        
-        # Forbidden words and concepts (Turkish and English)
-        self.forbidden_words = {
-            "violence": [
-                # Turkish
-                "şiddet", "kavga", "dövüş", "savaş", "vurmak", "öldürmek", "yaralamak",
-                "silah", "bıçak", "tabanca", "kan", "acı", "ağlamak", "korku", "korkunç",
-                "canavar", "ejder", "hayalet", "zombi", "ölüm", "ölmek", "cehennem",
-                # English
-                "violence", "fight", "war", "kill", "murder", "hurt", "weapon", "gun",
-                "knife", "blood", "pain", "cry", "fear", "scary", "monster", "dragon",
-                "ghost", "zombie", "death", "die", "hell"
-            ],
-            "inappropriate": [
-                # Turkish
-                "alkol", "sigara", "uyuşturucu", "kumar", "para", "zengin", "fakir",
-                "ayrılık", "boşanmak", "kavga", "kızgın", "sinirli", "stres",
-                # English  
-                "alcohol", "cigarette", "drugs", "gambling", "money", "rich", "poor",
-                "divorce", "separation", "angry", "stress", "adult"
-            ],
-            "complex_emotions": [
-                # Turkish
-                "depresyon", "kaygı", "endişe", "üzüntü", "yalnızlık", "kıskançlık",
-                "nefret", "öfke", "intikam", "suçluluk",
-                # English
-                "depression", "anxiety", "worry", "sadness", "loneliness", "jealousy",
-                "hate", "anger", "revenge", "guilt"
-            ]
-        }
-        
-        # Positive replacement concepts
-        self.positive_replacements = {
-            "fight": "oyun oyna",  # "play games"
-            "scary": "eğlenceli",  # "fun"
-            "monster": "sevimli hayvan",  # "cute animal"
-            "dark": "gece",  # "night"
-            "lost": "maceraya çık",  # "go on adventure"
-            "sad": "düşünceli",  # "thoughtful"
-            "angry": "biraz üzgün",  # "a little sad"
-            "kill": "uyut",  # "put to sleep"
-            "dead": "uyuyor",  # "sleeping"
-            "war": "yarışma",  # "competition"
-            "weapon": "sihirli değnek"  # "magic wand"
-        }
-        
-        # Age-appropriate themes to encourage
-        self.positive_themes = [
-            "dostluk", "yardımlaşma", "sevgi", "aile", "doğa", "hayvanlar",
-            "macera", "keşif", "öğrenme", "büyüme", "hayal kurma", "oyun",
-            "müzik", "sanat", "rengarenk", "güzellik", "mutluluk", "gülmek",
-            "friendship", "helping", "love", "family", "nature", "animals",
-            "adventure", "discovery", "learning", "growing", "imagination", "play",
-            "music", "art", "colorful", "beauty", "happiness", "laughing"
-        ]
-        
-        # Sentence patterns that might be problematic
-        self.problematic_patterns = [
-            r'\b(öl\w+|die\w*)\b',  # Death-related words
-            r'\b(korku\w+|fear\w*)\b',  # Fear-related words
-            r'\b(savaş\w+|war\w*)\b',  # War-related words
-            r'\b(kan\w*|blood\w*)\b',  # Blood-related words
-            r'\b(acı\w*|pain\w*)\b',  # Pain-related words
-        ]
+        # Word tables and automatons are built once and shared by all filters
+        self.forbidden_words = FORBIDDEN_WORDS
+        self.positive_replacements = POSITIVE_REPLACEMENTS
+        self.positive_themes = POSITIVE_THEMES
+        self._forbidden_automaton = _build_forbidden_automaton()
+        self._positive_theme_automaton = _build_positive_theme_automaton()
     
     async def validate_and_filter_prompt(self, prompt: str) -> str:
         """
@@ -147,122 +273,113 @@ class SafetyFilter:
     
     def _check_safety_violations(self, text: str) -> List[SafetyViolation]:
         """Check text for safety violations."""
+        return self._check_safety_violations_lower(text.lower())
+    
+    def _check_safety_violations_lower(self, text_lower: str) -> List[SafetyViolation]:
+        """Check already lower-cased text for safety violations."""
         violations = []
-        text_lower = text.lower()
-        
-        # Check forbidden words
-        for category, words in self.forbidden_words.items():
-            for word in words:
-                if word.lower() in text_lower:
-                    severity = "high" if category == "violence" else "medium"
-                    violations.append(SafetyViolation(
-                        category=category,
-                        description=f"Contains forbidden word: {word}",
-                        severity=severity,
-                        original_text=word,
-                        suggested_replacement=self.positive_replacements.get(word)
-                    ))
         
-        # Check problematic patterns
-        for pattern in self.problematic_patterns:
-            matches = re.finditer(pattern, text_lower)
-            for match in matches:
+        # Check forbidden words; each word is reported once however often it occurs
+        seen = set()
+        for _, (key, entries, replacement) in self._forbidden_automaton.iter(text_lower):
+            if key in seen:
+                continue
+            seen.add(key)
+            for category, word in entries:
+                severity = "high" if category == "violence" else "medium"
                 violations.append(SafetyViolation(
-                    category="pattern",
-                    description=f"Contains problematic pattern: {match.group()}",
-                    severity="medium",
-                    original_text=match.group()
+                    category=category,
+                    description=f"Contains forbidden word: {word}",
+                    severity=severity,
+                    original_text=word,
+                    suggested_replacement=replacement
                 ))
         
+        # Check problematic patterns
+        for match in PROBLEMATIC_PATTERN.finditer(text_lower):
+            violations.append(SafetyViolation(
+                category="pattern",
+                description=f"Contains problematic pattern ({match.lastgroup}): {match.group()}",
+                severity="medium",
+                original_text=match.group()
+            ))
+        
         return violations
     
+    def _count_violations(self, text_lower: str) -> Tuple[int, int]:
+        """
+        Count high- and medium-severity violations in lower-cased text.
+        
+        Counts the same violations as _check_safety_violations_lower without
+        building them, and stops at the first high-severity one.
+        """
+        medium_count = 0
+        seen = set()
+        for _, (key, entries, _) in self._forbidden_automaton.iter(text_lower):
+            if key in seen:
+                continue
+            seen.add(key)
+            for category, _ in entries:
+                if category == "violence":
+                    return 1, medium_count
+                medium_count += 1
+        
+        for _ in PROBLEMATIC_PATTERN.finditer(text_lower):
+            medium_count += 1
+        
+        return 0, medium_count
+    
     def _apply_safety_filters(self, text: str, violations: List[SafetyViolation]) -> str:
         """Apply safety filters to remove or replace problematic content."""
-        filtered_text = text
+        # Lower-cased word -> replacement, or None to remove the word
+        targets = {v.original_text.lower(): v.suggested_replacement for v in violations}
+        if not targets:
+            return WHITESPACE_PATTERN.sub(' ', text).strip()
         
-        for violation in violations:
-            if violation.suggested_replacement:
-                # Replace with positive alternative
-                filtered_text = filtered_text.replace(
-                    violation.original_text, 
-                    violation.suggested_replacement
-                )
-                logger.debug(
-                    f"Replaced '{violation.original_text}' with "
-                    f"'{violation.suggested_replacement}'"
-                )
+        text_lower = _lower_keep_offsets(text)
+        spans = []
+        
+        # Forbidden words with a replacement are swapped wherever they occur;
+        # the rest are only removed as whole words
+        for end, (key, _, _) in self._forbidden_automaton.iter(text_lower):
+            if key not in targets:
+                continue
+            start = end - len(key) + 1
+            replacement = targets[key]
+            if replacement or _is_whole_word(text_lower, start, end + 1):
+                spans.append((start, end + 1, replacement))
+        
+        # Pattern matches are whole words already
+        for match in PROBLEMATIC_PATTERN.finditer(text_lower):
+            if match.group() in targets:
+                spans.append((match.start(), match.end(), targets[match.group()]))
+        
+        # Rebuild the text in one pass, keeping the longest of overlapping spans
+        spans.sort(key=lambda span: (span[0], -span[1]))
+        parts = []
+        position = 0
+        for start, end, replacement in spans:
+            if start < position:
+                continue
+            parts.append(text[position:start])
+            if replacement:
+                parts.append(replacement)
+                logger.debug(f"Replaced '{text[start:end]}' with '{replacement}'")
             else:
-                # Remove problematic word/phrase
-                filtered_text = re.sub(
-                    rf'\b{re.escape(violation.original_text)}\b',
-                    '',
-                    filtered_text,
-                    flags=re.IGNORECASE
-                )
-                logger.debug(f"Removed '{violation.original_text}'")
+                logger.debug(f"Removed '{text[start:end]}'")
+            position = end
+        parts.append(text[position:])
         
         # Clean up extra spaces
-        filtered_text = re.sub(r'\s+', ' ', filtered_text).strip()
-        
-        return filtered_text
+        return WHITESPACE_PATTERN.sub(' ', ''.join(parts)).strip()
     
     def _enhance_prompt_with_safety(self, prompt: str) -> str:
         """Enhance prompt with explicit safety instructions."""
-        if self.language == "tr":
-            safety_prefix = f"""
-{self.target_age} yaşındaki bir çocuk için güvenli ve yaşına uygun bir uyku masalı oluştur.
-Hikaye şunları içermeli:
-- Sevgi dolu ve pozitif karakterler
-- Güvenli ve rahatlatıcı ortamlar  
-- Eğitici ve olumlu mesajlar
-- Huzur verici bir son
-
-Hikaye şunları içermemeli:
-- Şiddet, korku veya üzücü içerik
-- Karmaşık duygusal durumlar
-- Yetişkin konuları
-- Korkutucu karakterler veya durumlar
-
-Hikaye konusu: {prompt}
-
-Lütfen nazik, sevecen bir dille, uyku öncesi için uygun sakinleştirici bir hikaye yaz.
-"""
-        else:
-            safety_prefix = f"""
-Create a safe and age-appropriate bedtime story for a {self.target_age}-year-old child.
-The story should include:
-- Loving and positive characters
-- Safe and comforting environments
-- Educational and positive messages
-- A peaceful ending
-
-The story should NOT include:
-- Violence, fear, or sad content
-- Complex emotional situations
-- Adult topics
-- Scary characters or situations
-
-Story topic: {prompt}
-
-Please write a gentle, loving story suitable for bedtime in a soothing tone.
-"""
-        
-        return safety_prefix
+        return self._safety_prefix_head + prompt + self._safety_prefix_tail
     
     def _get_default_safe_prompt(self) -> str:
         """Get a default safe prompt when filtering fails."""
-        if self.language == "tr":
-            return """
-5 yaşındaki bir çocuk için güvenli bir uyku masalı oluştur.
-Hikaye sevimli hayvanlar, dostluk ve sevgi hakkında olsun.
-Rahatlatıcı ve huzur verici bir hikaye anlat.
-"""
-        else:
-            return """
-Create a safe bedtime story for a 5-year-old child.
-The story should be about cute animals, friendship, and love.
-Tell a soothing and peaceful story.
-"""
+        return self._default_safe_prompt
     
     async def validate_generated_content(self, content: str) -> bool:
         """
@@ -275,18 +392,16 @@ Tell a soothing and peaceful story.
             bool: True if content is safe
         """
         try:
-            violations = self._check_safety_violations(content)
+            high_count, medium_count = self._count_violations(content.lower())
             
             # Check for high-severity violations
-            high_severity = [v for v in violations if v.severity == "high"]
-            if high_severity:
-                logger.warning(f"Generated content contains high-severity violations: {high_severity}")
+            if high_count:
+                logger.warning("Generated content contains high-severity violations")
                 return False
             
             # Allow content with only low-severity violations
-            medium_severity = [v for v in violations if v.severity == "medium"]
-            if len(medium_severity) > 2:  # Too many medium violations
-                logger.warning(f"Generated content contains too many violations: {medium_severity}")
+            if medium_count > 2:  # Too many medium violations
+                logger.warning(f"Generated content contains too many violations: {medium_count}")
                 return False
             
             return True
@@ -305,13 +420,14 @@ Tell a soothing and peaceful story.
         Returns:
             Dict containing rating information
         """
-        violations = self._check_safety_violations(content)
+        # Lower-case once for both scans
+        content_lower = content.lower()
+        violations = self._check_safety_violations_lower(content_lower)
         
-        # Count positive themes
-        positive_count = 0
-        for theme in self.positive_themes:
-            if theme.lower() in content.lower():
-                positive_count += 1
+        # Count distinct positive themes
+        positive_count = len({
+            theme for _, theme in self._positive_theme_automaton.iter(content_lower)
+        })
         
         # Calculate safety score (0-100)
         base_score = 100
@@ -0,0 +1,158 @@
+"""
+Audio capture shared by the wakeword engines.
+Delivers microphone frames to the event loop without blocking it, so other
+coroutines such as TTS playback or LLM streaming keep running.
+"""
+
+import asyncio
+import logging
+from typing import Any, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# pyaudio.paContinue; tells PortAudio to keep the stream running
+PA_CONTINUE = 0
+
+# Device name fragments preferred for capture on Pi setups
+PREFERRED_DEVICE_KEYWORDS = ("codec", "usb", "audio")
+
+# Upper bound on engine frames per PortAudio buffer, to cap added latency
+MAX_FRAMES_PER_BUFFER_MULTIPLE = 8
+
+
+def find_input_device(audio: Any) -> int:
+    """
+    Find the best input device for audio capture.
+
+    Devices whose name contains a preferred keyword win; otherwise the first
+    device with input channels is used. Each device is queried only once.
+
+    Args:
+        audio: PyAudio instance
+
+    Returns:
+        int: Device index, or 0 if no input device could be found
+    """
+    try:
+        first_input = None
+        for i in range(audio.get_device_count()):
+            device_info = audio.get_device_info_by_index(i)
+            if device_info["maxInputChannels"] <= 0:
+                continue
+
+            logger.info(f"Found input device {i}: {device_info['name']}")
+            device_name_lower = device_info["name"].lower()
+            if any(keyword in device_name_lower for keyword in PREFERRED_DEVICE_KEYWORDS):
+                logger.info(f"Selected preferred device {i}: {device_info['name']}")
+                return i
+            if first_input is None:
+                first_input = (i, device_info["name"])
+
+        if first_input is None:
+            raise RuntimeError("No audio input devices found")
+
+        logger.info(f"Using first available input device {first_input[0]}: {first_input[1]}")
+        return first_input[0]
+
+    except Exception as e:
+        logger.error(f"Error finding input device: {e}")
+        return 0  # Default to device 0
+
+
+def aligned_frames_per_buffer(audio: Any, device_index: Optional[int], frames: int, sample_rate: int) -> int:
+    """
+    Choose a PortAudio buffer size that matches the device's period.
+
+    Returns the smallest power-of-two multiple of the engine frame that
+    covers the device's default low input latency, so one callback carries
+    whole device periods instead of PortAudio splitting them up.
+
+    Args:
+        audio: PyAudio instance
+        device_index: Input device index, or None for the default device
+        frames: Frames per engine frame
+        sample_rate: Stream sample rate in Hz
+
+    Returns:
+        int: Frames per buffer, a multiple of frames
+    """
+    try:
+        if device_index is None:
+            device_info = audio.get_default_input_device_info()
+        else:
+            device_info = audio.get_device_info_by_index(device_index)
+        period = int(device_info["defaultLowInputLatency"] * sample_rate)
+    except Exception as e:
+        logger.debug(f"Could not read device latency, using engine frame size: {e}")
+        return frames
+
+    multiple = 1
+    while frames * multiple < period and multiple < MAX_FRAMES_PER_BUFFER_MULTIPLE:
+        multiple *= 2
+    return frames * multiple
+
+
+class AudioFrameReader:
+    """
+    Receives frames from a PyAudio stream opened in callback mode.
+
+    Pass on_audio as the stream_callback. PortAudio calls it from its own
+    audio thread with one buffer at a time; buffers larger than frame_bytes
+    are split into engine-sized frames, and the frames are handed to the
+    event loop through a small asyncio.Queue. No extra reader thread is
+    needed. When the queue is full the oldest frame is dropped, keeping
+    detection on live audio if inference falls behind.
+    """
+
+    def __init__(self, max_queued: int = 4, frame_bytes: Optional[int] = None):
+        self.frame_bytes = frame_bytes
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped = False
+
+    def start(self) -> None:
+        """Bind to the running event loop; call before opening the stream."""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = False
+
+    def on_audio(self, in_data: bytes, frame_count: int, time_info: Any, status: int) -> Tuple[None, int]:
+        """PyAudio stream callback, called on the PortAudio thread."""
+        if not self._stopped:
+            frame_bytes = self.frame_bytes
+            if frame_bytes and len(in_data) > frame_bytes:
+                # memoryview windows share the buffer instead of copying it
+                view = memoryview(in_data)
+                frames = [view[i:i + frame_bytes] for i in range(0, len(view), frame_bytes)]
+            else:
+                frames = (in_data,)
+            try:
+                self._loop.call_soon_threadsafe(self._put_frames, frames)
+            except RuntimeError:
+                pass  # Event loop already closed
+        return None, PA_CONTINUE
+
+    async def read(self) -> Optional[Union[bytes, memoryview]]:
+        """
+        Wait for the next frame.
+
+        Returns:
+            Optional[Union[bytes, memoryview]]: Raw frame data (a view when
+            split from a larger buffer), or None once capture has stopped
+        """
+        return await self._queue.get()
+
+    async def stop(self) -> None:
+        """Stop delivering frames and wake any waiting reader."""
+        self._stopped = True
+        self._put(None)
+
+    def _put_frames(self, frames: Sequence[Union[bytes, memoryview]]) -> None:
+        """Queue the frames from one PortAudio buffer."""
+        for frame in frames:
+            self._put(frame)
+
+    def _put(self, data: Optional[Union[bytes, memoryview]]) -> None:
+        """Queue a frame on the event loop, dropping the oldest if full."""
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(data)
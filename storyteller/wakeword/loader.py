@@ -4,10 +4,13 @@ Implements memory-safe loading of only the configured wakeword engine.
 Critical for maintaining the 400MB RAM constraint on Pi Zero 2W.
 """
 
+import gc
 import importlib
 import logging
 import asyncio
-from typing import Optional, Dict, Any, Callable
+import time
+import weakref
+from typing import Optional, Dict, Any, Callable, Set
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
@@ -24,6 +27,9 @@ class WakewordEngine(ABC):
         self.is_listening = False
         self.detection_callback: Optional[Callable] = None
         self._stop_event = asyncio.Event()
+        # The event loop only keeps weak references to tasks, so running
+        # coroutine callbacks are held here until they finish
+        self._callback_tasks: Set[asyncio.Task] = set()
     
     @abstractmethod
     async def initialize(self) -> None:
@@ -59,6 +65,37 @@ class WakewordEngine(ABC):
     def get_memory_usage(self) -> Dict[str, Any]:
         """Get current memory usage information."""
         pass
+    
+    async def _notify_detection(self, keyword: str) -> None:
+        """
+        Hand a detected keyword to the detection callback.
+        
+        Coroutine callbacks are scheduled as tasks and plain callbacks are
+        called on the event loop, so they can schedule async work themselves.
+        Set "callback_in_executor" in the config for slow blocking callbacks.
+        Errors from callback tasks are logged when the task finishes.
+        """
+        callback = self.detection_callback
+        if callback is None:
+            return
+        try:
+            if asyncio.iscoroutinefunction(callback):
+                task = asyncio.create_task(callback(keyword))
+                self._callback_tasks.add(task)
+                task.add_done_callback(self._on_callback_done)
+            elif self.config.get("callback_in_executor", False):
+                await asyncio.get_running_loop().run_in_executor(None, callback, keyword)
+            else:
+                callback(keyword)
+        except Exception as e:
+            # A failing handler must not stop wake word detection
+            logger.error(f"Wake word callback failed: {e}")
+    
+    def _on_callback_done(self, task: asyncio.Task) -> None:
+        """Release a finished callback task and log its error, if any."""
+        self._callback_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Wake word callback failed: {task.exception()}")
 
 
 class EngineStatus(Enum):
@@ -74,9 +111,11 @@ class EngineStatus(Enum):
 @dataclass
 class WakewordDetection:
     """Wake word detection event."""
+    __slots__ = ("keyword", "confidence", "timestamp", "engine_name")
+    
     keyword: str
     confidence: float
-    timestamp: float
+    timestamp: int  # time.monotonic_ns() at detection
     engine_name: str
 
 
@@ -94,6 +133,9 @@ class WakewordEngineLoader:
             "porcupine": "storyteller.wakeword.porcupine_engine",
             "openwakeword": "storyteller.wakeword.openwakeword_engine"
         }
+        # create_engine functions of engines imported so far, so reloading
+        # an engine skips the module import
+        self._engine_factories: Dict[str, Callable] = {}
     
     async def load_engine(self, engine_name: str, config: Dict[str, Any]) -> WakewordEngine:
         """
@@ -130,19 +172,24 @@ class WakewordEngineLoader:
             module_path = self._supported_engines[engine_name]
             logger.info(f"Loading wakeword engine: {engine_name} from {module_path}")
             
-            try:
-                engine_module = importlib.import_module(module_path)
-            except ImportError as e:
-                logger.error(f"Failed to import {module_path}: {e}")
-                raise ImportError(f"Could not import {engine_name} engine: {e}")
-            
-            # Get the engine creation function
-            if not hasattr(engine_module, 'create_engine'):
-                raise ImportError(f"Engine module {module_path} missing 'create_engine' function")
+            factory = self._engine_factories.get(engine_name)
+            if factory is None:
+                try:
+                    engine_module = importlib.import_module(module_path)
+                except ImportError as e:
+                    logger.error(f"Failed to import {module_path}: {e}")
+                    raise ImportError(f"Could not import {engine_name} engine: {e}")
+                
+                # Get the engine creation function
+                if not hasattr(engine_module, 'create_engine'):
+                    raise ImportError(f"Engine module {module_path} missing 'create_engine' function")
+                
+                factory = engine_module.create_engine
+                self._engine_factories[engine_name] = factory
             
             # Create engine instance
             try:
-                engine = await engine_module.create_engine(config)
+                engine = await factory(config)
             except Exception as e:
                 logger.error(f"Failed to create {engine_name} engine: {e}")
                 raise RuntimeError(f"Failed to create {engine_name} engine: {e}")
@@ -155,6 +202,9 @@ class WakewordEngineLoader:
                 await engine.cleanup()  # Clean up partial initialization
                 raise RuntimeError(f"Failed to initialize {engine_name} engine: {e}")
             
+            # Log when the engine is actually freed after unloading
+            weakref.finalize(engine, logger.debug, f"Engine {engine_name} freed")
+            
             # Store the engine
             self.current_engine = engine
             self.current_engine_name = engine_name
@@ -196,9 +246,11 @@ class WakewordEngineLoader:
         except Exception as e:
             logger.error(f"Error during engine cleanup: {e}")
         finally:
-            # Clear references to help garbage collection
+            # Clear references and collect now, so the old engine's models
+            # are freed before the next engine loads its own
             self.current_engine = None
             self.current_engine_name = None
+            gc.collect()
     
     async def start_detection(self, callback: Callable[[WakewordDetection], None]) -> None:
         """
@@ -207,27 +259,25 @@ class WakewordEngineLoader:
         Args:
             callback: Function to call when wake word is detected
         """
-        if not self.current_engine:
+        engine = self.current_engine
+        engine_name = self.current_engine_name
+        if not engine:
             raise RuntimeError("No engine loaded. Call load_engine() first.")
         
         if self.status != EngineStatus.READY:
             raise RuntimeError(f"Engine not ready. Status: {self.status}")
         
         try:
-            # Wrap the callback to create WakewordDetection objects
+            # Wrap the callback to create WakewordDetection objects; the
+            # clock and engine name are bound once, not looked up per detection
+            now = time.monotonic_ns
+            
             def detection_wrapper(keyword: str, confidence: float = 1.0):
-                import time
-                detection = WakewordDetection(
-                    keyword=keyword,
-                    confidence=confidence,
-                    timestamp=time.time(),
-                    engine_name=self.current_engine_name
-                )
-                callback(detection)
+                callback(WakewordDetection(keyword, confidence, now(), engine_name))
             
-            await self.current_engine.start_listening(detection_wrapper)
+            await engine.start_listening(detection_wrapper)
             self.status = EngineStatus.LISTENING
-            logger.info(f"Started wake word detection with {self.current_engine_name}")
+            logger.info(f"Started wake word detection with {engine_name}")
             
         except Exception as e:
             self.status = EngineStatus.ERROR
@@ -236,11 +286,12 @@ class WakewordEngineLoader:
     
     async def stop_detection(self) -> None:
         """Stop wake word detection."""
-        if not self.current_engine:
+        engine = self.current_engine
+        if not engine:
             return
         
         try:
-            await self.current_engine.stop_listening()
+            await engine.stop_listening()
             self.status = EngineStatus.READY
             logger.info("Stopped wake word detection")
             
@@ -5,11 +5,15 @@ Provides integration with openWakeWord for lightweight wake word detection.
 
 import asyncio
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+import time
 import numpy as np
 from typing import Dict, Any, Callable, List, Optional
 import pyaudio
 import psutil
 
+from .audio_capture import AudioFrameReader, aligned_frames_per_buffer, find_input_device
 from .loader import WakewordEngine
 
 logger = logging.getLogger(__name__)
@@ -26,19 +30,35 @@ class OpenWakeWordEngine(WakewordEngine):
         self.audio_stream = None
         self.audio = None
         self.detection_task = None
+        self.frame_reader: Optional[AudioFrameReader] = None
+        # Kept for memory reports instead of re-creating it per call
+        self._process = psutil.Process()
+        # Inference runs here so it never blocks the event loop
+        self._infer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wakeword-infer")
         
         # Configuration
         self.model_paths = config.get("model_paths", [])
         self.inference_framework = config.get("inference_framework", "tflite")
+        # Prefer int8-quantized ONNX models (<name>_int8.onnx) where available
+        self.quantize = config.get("quantize", False)
         self.threshold = config.get("threshold", 0.5)
         self.vad_threshold = config.get("vad_threshold", 0.5)
+        # Inference threads for the feature models; two keeps a Pi responsive
+        self.num_threads = config.get("num_threads", min(2, os.cpu_count() or 1))
         
         # Audio settings
         self.sample_rate = 16000  # OpenWakeWord expects 16kHz
         self.chunk_size = 1280    # 80ms chunks (16000 * 0.08)
+        # Chunks per predict() call; each extra chunk adds 80 ms of latency
+        # but saves one model dispatch
+        self.batch_chunks = max(1, int(config.get("batch_chunks", 1)))
+        self.frames_per_read = self.chunk_size * self.batch_chunks
         self.channels = 1         # Mono audio
         self.audio_format = pyaudio.paInt16
         
+        # Reused for each chunk's float32 samples instead of allocating per read
+        self._f32_buf = np.empty(self.frames_per_read, dtype=np.float32)
+        
         # Device settings
         self.input_device_index = config.get("input_device_index")
         
@@ -73,8 +93,9 @@ class OpenWakeWordEngine(WakewordEngine):
             # Initialize model
             model_kwargs = {
                 "inference_framework": self.inference_framework,
-                "wakeword_models": self.model_paths if self.model_paths else None,
-                "vad_threshold": self.vad_threshold
+                "wakeword_models": self._resolve_model_paths() if self.model_paths else None,
+                "vad_threshold": self.vad_threshold,
+                "ncpu": self.num_threads
             }
             
             # Remove None values to use defaults
@@ -90,48 +111,36 @@ class OpenWakeWordEngine(WakewordEngine):
                 self.input_device_index = self._find_input_device()
             
             logger.info(f"OpenWakeWord engine initialized successfully")
-            logger.info(f"Inference framework: {self.inference_framework}")
+            logger.info(f"Inference framework: {self.inference_framework} ({self.num_threads} threads)")
             logger.info(f"Available models: {list(self.oww_model.prediction_buffer.keys())}")
             logger.info(f"VAD threshold: {self.vad_threshold}")
             logger.info(f"Sample rate: {self.sample_rate} Hz")
-            logger.info(f"Chunk size: {self.chunk_size}")
+            logger.info(f"Chunk size: {self.chunk_size} x {self.batch_chunks}")
             
         except Exception as e:
             logger.error(f"Failed to initialize OpenWakeWord engine: {e}")
             await self.cleanup()
             raise
     
+    def _resolve_model_paths(self) -> List[str]:
+        """Swap in int8-quantized ONNX models that sit next to the configured ones."""
+        if not (self.quantize and self.inference_framework == "onnx"):
+            return self.model_paths
+        
+        resolved = []
+        for path in self.model_paths:
+            root, ext = os.path.splitext(path)
+            quantized = f"{root}_int8.onnx"
+            if ext == ".onnx" and not root.endswith("_int8") and os.path.exists(quantized):
+                logger.info(f"Using quantized model: {quantized}")
+                resolved.append(quantized)
+            else:
+                resolved.append(path)
+        return resolved
+    
     def _find_input_device(self) -> int:
         """Find the best input device for audio capture."""
-        try:
-            device_count = self.audio.get_device_count()
-            
-            # Look for devices with input channels
-            for i in range(device_count):
-                device_info = self.audio.get_device_info_by_index(i)
-                
-                if device_info["maxInputChannels"] > 0:
-                    logger.info(f"Found input device {i}: {device_info['name']}")
-                    
-                    # Prefer devices with "codec" or "usb" in the name for Pi setups
-                    device_name_lower = device_info["name"].lower()
-                    if any(keyword in device_name_lower for keyword in ["codec", "usb", "audio"]):
-                        logger.info(f"Selected preferred device {i}: {device_info['name']}")
-                        return i
-            
-            # If no preferred device found, use the first available input device
-            for i in range(device_count):
-                device_info = self.audio.get_device_info_by_index(i)
-                if device_info["maxInputChannels"] > 0:
-                    logger.info(f"Using first available input device {i}: {device_info['name']}")
-                    return i
-            
-            # No input devices found
-            raise RuntimeError("No audio input devices found")
-            
-        except Exception as e:
-            logger.error(f"Error finding input device: {e}")
-            return 0  # Default to device 0
+        return find_input_device(self.audio)
     
     async def start_listening(self, callback: Callable[[str], None]) -> None:
         """Start listening for wake words."""
@@ -148,6 +157,19 @@ class OpenWakeWordEngine(WakewordEngine):
             # Reset model state
             self.oww_model.reset()
             
+            # Buffer whole device periods; the reader splits them into frames
+            frames_per_buffer = aligned_frames_per_buffer(
+                self.audio, self.input_device_index, self.frames_per_read, self.sample_rate
+            )
+            
+            # PortAudio delivers frames through a callback, so reading never
+            # blocks the event loop
+            self.frame_reader = AudioFrameReader(
+                max_queued=4 * frames_per_buffer // self.frames_per_read,
+                frame_bytes=self.frames_per_read * self.channels * 2  # 16-bit samples
+            )
+            self.frame_reader.start()
+            
             # Open audio stream
             self.audio_stream = self.audio.open(
                 format=self.audio_format,
@@ -155,7 +177,8 @@ class OpenWakeWordEngine(WakewordEngine):
                 rate=self.sample_rate,
                 input=True,
                 input_device_index=self.input_device_index,
-                frames_per_buffer=self.chunk_size
+                frames_per_buffer=frames_per_buffer,
+                stream_callback=self.frame_reader.on_audio
             )
             
             # Start detection task
@@ -175,44 +198,51 @@ class OpenWakeWordEngine(WakewordEngine):
     
     async def _detection_loop(self) -> None:
         """Main detection loop running in a separate task."""
+        # Bind per-frame lookups once
+        loop = asyncio.get_running_loop()
+        monotonic = time.monotonic
+        read = self.frame_reader.read
+        predict = self.oww_model.predict
+        infer_executor = self._infer_executor
+        f32_buf = self._f32_buf
+        scale = np.float32(1.0 / 32768.0)
+        
         try:
             while self.is_listening and not self._stop_event.is_set():
+                # Wait for the next audio chunk
+                audio_data = await read()
+                if audio_data is None:
+                    break
+                
+                # Convert to float32 in place (OpenWakeWord expects float32)
+                int16_view = np.frombuffer(audio_data, dtype=np.int16)
+                np.multiply(int16_view, scale, out=f32_buf)
+                
+                # Process audio with OpenWakeWord
                 try:
-                    # Read audio chunk
-                    audio_data = self.audio_stream.read(self.chunk_size, exception_on_overflow=False)
-                    
-                    # Convert to numpy array (OpenWakeWord expects float32)
-                    audio_array = np.frombuffer(audio_data, dtype=np.int16).astype(np.float32) / 32768.0
-                    
-                    # Process audio with OpenWakeWord
-                    prediction = self.oww_model.predict(audio_array)
-                    
-                    # Check for wake word detections
-                    current_time = asyncio.get_event_loop().time()
-                    
-                    for model_name, score in prediction.items():
-                        if score >= self.prediction_threshold:
-                            # Check debounce time
-                            if current_time - self.last_detection_time > self.debounce_time:
-                                logger.info(f"Wake word detected: {model_name} (score: {score:.3f})")
-                                self.last_detection_time = current_time
-                                
-                                if self.detection_callback:
-                                    # Run callback in executor to avoid blocking
-                                    loop = asyncio.get_event_loop()
-                                    await loop.run_in_executor(
-                                        None, 
-                                        self.detection_callback, 
-                                        model_name
-                                    )
+                    prediction = await loop.run_in_executor(infer_executor, predict, f32_buf)
+                except (RuntimeError, ValueError) as e:
+                    # A failed inference costs one frame, not the whole loop
+                    logger.error(f"OpenWakeWord inference failed: {e}")
+                    continue
                 
-                except Exception as e:
-                    if self.is_listening:  # Only log if we're still supposed to be listening
-                        logger.error(f"Error in detection loop: {e}")
-                    break
+                # Nearly every chunk scores below the threshold on all
+                # models; one max() rules those out without a Python loop
+                threshold = self.prediction_threshold
+                if not prediction or max(prediction.values()) < threshold:
+                    continue
+                
+                # Check for wake word detections
+                current_time = monotonic()
                 
-                # Small sleep to prevent tight loop
-                await asyncio.sleep(0.01)
+                for model_name, score in prediction.items():
+                    if score >= threshold:
+                        # Check debounce time
+                        if current_time - self.last_detection_time > self.debounce_time:
+                            logger.info(f"Wake word detected: {model_name} (score: {score:.3f})")
+                            self.last_detection_time = current_time
+                            
+                            await self._notify_detection(model_name)
                 
         except asyncio.CancelledError:
             logger.info("Detection loop cancelled")
@@ -245,12 +275,19 @@ class OpenWakeWordEngine(WakewordEngine):
             self.audio_stream.close()
             self.audio_stream = None
         
+        if self.frame_reader:
+            await self.frame_reader.stop()
+            self.frame_reader = None
+        
         logger.info("Stopped wake word detection")
     
     async def cleanup(self) -> None:
         """Clean up OpenWakeWord resources."""
         await self.stop_listening()
         
+        # Let a cancelled loop's last inference finish before freeing the model
+        self._infer_executor.shutdown(wait=True)
+        
         if self.oww_model:
             # OpenWakeWord doesn't have explicit cleanup, but we can clear references
             self.oww_model = None
@@ -270,14 +307,13 @@ class OpenWakeWordEngine(WakewordEngine):
     def get_memory_usage(self) -> Dict[str, Any]:
         """Get current memory usage information."""
         try:
-            process = psutil.Process()
-            memory_info = process.memory_info()
+            memory_info = self._process.memory_info()
             
             return {
                 "engine": "openwakeword",
                 "rss_mb": memory_info.rss / 1024 / 1024,
                 "vms_mb": memory_info.vms / 1024 / 1024,
-                "percent": process.memory_percent(),
+                "percent": self._process.memory_percent(),
                 "models_loaded": len(self.get_supported_keywords()),
                 "inference_framework": self.inference_framework,
                 "is_listening": self.is_listening
@@ -292,11 +328,14 @@ class OpenWakeWordEngine(WakewordEngine):
             "engine_name": "openwakeword",
             "version": getattr(self.openwakeword, '__version__', 'unknown') if hasattr(self, 'openwakeword') else 'unknown',
             "inference_framework": self.inference_framework,
+            "num_threads": self.num_threads,
+            "quantize": self.quantize,
             "available_models": self.get_supported_keywords(),
             "prediction_threshold": self.prediction_threshold,
             "vad_threshold": self.vad_threshold,
             "sample_rate": self.sample_rate,
             "chunk_size": self.chunk_size,
+            "batch_chunks": self.batch_chunks,
             "channels": self.channels,
             "is_listening": self.is_listening,
             "input_device_index": self.input_device_index,
@@ -368,6 +407,11 @@ def validate_openwakeword_config(config: Dict[str, Any]) -> bool:
         logger.error(f"VAD threshold must be between 0.0 and 1.0: {vad_threshold}")
         return False
     
+    batch_chunks = config.get("batch_chunks", 1)
+    if batch_chunks < 1:
+        logger.error(f"Batch chunks must be at least 1: {batch_chunks}")
+        return False
+    
     return True
 
 
@@ -5,12 +5,14 @@ Provides integration with Picovoice Porcupine for high-accuracy wake word detect
 
 import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import os
-import struct
 from typing import Dict, Any, Callable, List, Optional
+import numpy as np
 import pyaudio
 import psutil
 
+from .audio_capture import AudioFrameReader, aligned_frames_per_buffer, find_input_device
 from .loader import WakewordEngine
 
 logger = logging.getLogger(__name__)
@@ -27,6 +29,11 @@ class PorcupineEngine(WakewordEngine):
         self.audio_stream = None
         self.audio = None
         self.detection_task = None
+        self.frame_reader: Optional[AudioFrameReader] = None
+        # Kept for memory reports instead of re-creating it per call
+        self._process = psutil.Process()
+        # Inference runs here so it never blocks the event loop
+        self._infer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wakeword-infer")
         
         # Configuration
         self.access_key = config.get("access_key")
@@ -102,35 +109,7 @@ class PorcupineEngine(WakewordEngine):
     
     def _find_input_device(self) -> int:
         """Find the best input device for audio capture."""
-        try:
-            device_count = self.audio.get_device_count()
-            
-            # Look for devices with input channels
-            for i in range(device_count):
-                device_info = self.audio.get_device_info_by_index(i)
-                
-                if device_info["maxInputChannels"] > 0:
-                    logger.info(f"Found input device {i}: {device_info['name']}")
-                    
-                    # Prefer devices with "codec" or "usb" in the name for Pi setups
-                    device_name_lower = device_info["name"].lower()
-                    if any(keyword in device_name_lower for keyword in ["codec", "usb", "audio"]):
-                        logger.info(f"Selected preferred device {i}: {device_info['name']}")
-                        return i
-            
-            # If no preferred device found, use the first available input device
-            for i in range(device_count):
-                device_info = self.audio.get_device_info_by_index(i)
-                if device_info["maxInputChannels"] > 0:
-                    logger.info(f"Using first available input device {i}: {device_info['name']}")
-                    return i
-            
-            # No input devices found
-            raise RuntimeError("No audio input devices found")
-            
-        except Exception as e:
-            logger.error(f"Error finding input device: {e}")
-            return 0  # Default to device 0
+        return find_input_device(self.audio)
     
     async def start_listening(self, callback: Callable[[str], None]) -> None:
         """Start listening for wake words."""
@@ -144,6 +123,19 @@ class PorcupineEngine(WakewordEngine):
         try:
             self.detection_callback = callback
             
+            # Buffer whole device periods; the reader splits them into frames
+            frames_per_buffer = aligned_frames_per_buffer(
+                self.audio, self.input_device_index, self.frame_length, self.sample_rate
+            )
+            
+            # PortAudio delivers frames through a callback, so reading never
+            # blocks the event loop
+            self.frame_reader = AudioFrameReader(
+                max_queued=4 * frames_per_buffer // self.frame_length,
+                frame_bytes=self.frame_length * self.channels * 2  # 16-bit samples
+            )
+            self.frame_reader.start()
+            
             # Open audio stream
             self.audio_stream = self.audio.open(
                 format=self.audio_format,
@@ -151,7 +143,8 @@ class PorcupineEngine(WakewordEngine):
                 rate=self.sample_rate,
                 input=True,
                 input_device_index=self.input_device_index,
-                frames_per_buffer=self.frame_length
+                frames_per_buffer=frames_per_buffer,
+                stream_callback=self.frame_reader.on_audio
             )
             
             # Start detection task
@@ -171,37 +164,36 @@ class PorcupineEngine(WakewordEngine):
     
     async def _detection_loop(self) -> None:
         """Main detection loop running in a separate task."""
+        # Bind per-frame lookups once
+        loop = asyncio.get_running_loop()
+        read = self.frame_reader.read
+        process = self.porcupine.process
+        infer_executor = self._infer_executor
+        
         try:
             while self.is_listening and not self._stop_event.is_set():
-                try:
-                    # Read audio frame
-                    pcm = self.audio_stream.read(self.frame_length, exception_on_overflow=False)
-                    pcm_data = struct.unpack_from("h" * self.frame_length, pcm)
-                    
-                    # Process frame with Porcupine
-                    keyword_index = self.porcupine.process(pcm_data)
-                    
-                    if keyword_index >= 0:
-                        # Wake word detected
-                        detected_keyword = self.keywords[keyword_index]
-                        logger.info(f"Wake word detected: {detected_keyword}")
-                        
-                        if self.detection_callback:
-                            # Run callback in executor to avoid blocking
-                            loop = asyncio.get_event_loop()
-                            await loop.run_in_executor(
-                                None, 
-                                self.detection_callback, 
-                                detected_keyword
-                            )
-                
-                except Exception as e:
-                    if self.is_listening:  # Only log if we're still supposed to be listening
-                        logger.error(f"Error in detection loop: {e}")
+                # Wait for the next audio frame
+                pcm = await read()
+                if pcm is None:
                     break
+                # process() copies the samples into a ctypes array one by one,
+                # which is fastest from a list of plain ints
+                pcm_data = np.frombuffer(pcm, dtype=np.int16).tolist()
                 
-                # Small sleep to prevent tight loop
-                await asyncio.sleep(0.01)
+                # Process frame with Porcupine
+                try:
+                    keyword_index = await loop.run_in_executor(infer_executor, process, pcm_data)
+                except self.pvporcupine.PorcupineError as e:
+                    # A failed inference costs one frame, not the whole loop
+                    logger.error(f"Porcupine processing failed: {e}")
+                    continue
+                
+                if keyword_index >= 0:
+                    # Wake word detected
+                    detected_keyword = self.keywords[keyword_index]
+                    logger.info(f"Wake word detected: {detected_keyword}")
+                    
+                    await self._notify_detection(detected_keyword)
                 
         except asyncio.CancelledError:
             logger.info("Detection loop cancelled")
@@ -234,12 +226,19 @@ class PorcupineEngine(WakewordEngine):
             self.audio_stream.close()
             self.audio_stream = None
         
+        if self.frame_reader:
+            await self.frame_reader.stop()
+            self.frame_reader = None
+        
         logger.info("Stopped wake word detection")
     
     async def cleanup(self) -> None:
         """Clean up Porcupine resources."""
         await self.stop_listening()
         
+        # Let a cancelled loop's last inference finish before freeing the model
+        self._infer_executor.shutdown(wait=True)
+        
         if self.porcupine:
             self.porcupine.delete()
             self.porcupine = None
@@ -257,14 +256,13 @@ class PorcupineEngine(WakewordEngine):
     def get_memory_usage(self) -> Dict[str, Any]:
         """Get current memory usage information."""
         try:
-            process = psutil.Process()
-            memory_info = process.memory_info()
+            memory_info = self._process.memory_info()
             
             return {
                 "engine": "porcupine",
                 "rss_mb": memory_info.rss / 1024 / 1024,
                 "vms_mb": memory_info.vms / 1024 / 1024,
-                "percent": process.memory_percent(),
+                "percent": self._process.memory_percent(),
                 "keywords_loaded": len(self.keywords),
                 "is_listening": self.is_listening
             }
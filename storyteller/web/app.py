@@ -4,32 +4,104 @@ Provides story library management, configuration, and real-time status.
 """
 
 import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import importlib.util
 import logging
+import os
+import re
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException, Depends, Request, WebSocket
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+import jinja2
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field
+import orjson
 import uvicorn
 
 from ..config.settings import get_settings
-from ..storage.models import get_database_session, create_database_engine
+from ..storage.models import AgeRating, LanguageCode, get_database_session, get_session_factory, create_database_engine
 from ..storage.story_library import StoryLibrary
 from ..core.agent import StorytellingAgent
 from ..providers.base import ProviderManager
+from ..wakeword.loader import WakewordDetection
 
 logger = logging.getLogger(__name__)
 
+# Seconds between protocol-level WebSocket pings, and to wait for the pong
+WS_PING_INTERVAL = 20.0
+WS_PING_TIMEOUT = 20.0
+
+# Updates kept for a client that is not reading; older ones are dropped
+MAX_PENDING_WEBSOCKET_MESSAGES = 64
+
+# Seconds an assembled /api/status response is reused for polling clients
+STATUS_CACHE_TTL = 0.5
+
+# Static files whose name carries a content hash, e.g. app-3f9a1c2b.css
+FINGERPRINTED_ASSET_PATTERN = re.compile(r"-[0-9a-f]{8,}\.")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    Static files that let browsers keep fingerprinted assets for a year.
+    
+    A fingerprinted file never changes under the same name, so it is marked
+    immutable; other files keep the default ETag revalidation.
+    """
+    
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if FINGERPRINTED_ASSET_PATTERN.search(os.path.basename(full_path)):
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+class WebSocketOutbox:
+    """
+    Outbound update queue for one WebSocket client.
+    
+    Broadcasts append to a deque and resolve a future to wake the client's
+    writer task, so a broadcast never waits on any client's network send.
+    """
+    
+    __slots__ = ("messages", "_waker")
+    
+    def __init__(self, max_pending: int = MAX_PENDING_WEBSOCKET_MESSAGES):
+        self.messages: deque = deque(maxlen=max_pending)
+        self._waker: Optional[asyncio.Future] = None
+    
+    def put(self, payload: bytes) -> None:
+        """Queue a serialized update and wake the writer."""
+        self.messages.append(payload)
+        if self._waker is not None and not self._waker.done():
+            self._waker.set_result(None)
+    
+    async def drain(self, websocket: WebSocket) -> None:
+        """Send queued updates to the client until cancelled or a send fails."""
+        loop = asyncio.get_running_loop()
+        messages = self.messages
+        while True:
+            if not messages:
+                self._waker = loop.create_future()
+                await self._waker
+                self._waker = None
+            while messages:
+                await websocket.send_bytes(messages.popleft())
+
 # Pydantic models for API
 class StoryRequest(BaseModel):
     """Request model for story generation."""
     prompt: str = Field(..., min_length=1, max_length=500)
-    language: str = Field(default="tr", pattern="^(tr|en)$")
-    age_rating: str = Field(default="5+", pattern="^[0-9]+\\+$")
+    language: LanguageCode = "tr"
+    age_rating: AgeRating = "5+"
     
 class StoryResponse(BaseModel):
     """Response model for story generation."""
@@ -44,10 +116,32 @@ class SessionInfo(BaseModel):
     language: str
     age_rating: str
     status: str
-    created_at: datetime
-    completed_at: Optional[datetime] = None
+    # Stored sessions name these start_time/end_time
+    created_at: datetime = Field(validation_alias=AliasChoices("created_at", "start_time"))
+    completed_at: Optional[datetime] = Field(
+        default=None, validation_alias=AliasChoices("completed_at", "end_time")
+    )
     paragraphs_generated: int = 0
     
+    model_config = ConfigDict(from_attributes=True)
+    
+# SessionInfo's compiled pydantic-core serializer, bound once for the
+# streamed story list; it writes JSON bytes without an intermediate dict
+dump_session_info = SessionInfo.__pydantic_serializer__.to_json
+    
+class MessageResponse(BaseModel):
+    """Response model for simple acknowledgements."""
+    message: str
+    
+class SettingsInfo(BaseModel):
+    """Settings exposed through the API."""
+    wakeword_engine: str
+    story_language: str
+    story_age_rating: str
+    story_max_paragraphs: int
+    max_memory_mb: int
+    content_safety_enabled: bool
+    
 class SystemStatus(BaseModel):
     """System status model."""
     state: str
@@ -70,16 +164,35 @@ class WebApplication:
         self.agent: Optional[StorytellingAgent] = None
         self.story_library: Optional[StoryLibrary] = None
         self.database_engine = None
-        self.websocket_connections: List[WebSocket] = []
+        self.websocket_connections: Dict[WebSocket, WebSocketOutbox] = {}
+        # (monotonic time built, status); created lazily on the serving loop
+        self._status_cache: Optional[Tuple[float, SystemStatus]] = None
+        self._status_lock: Optional[asyncio.Lock] = None
+        
+        # Compress larger JSON responses such as the story list
+        self.app.add_middleware(GZipMiddleware, minimum_size=500)
         
         # Setup templates and static files
-        self.templates = Jinja2Templates(directory="storyteller/web/templates")
+        # Compiled templates are cached on disk, so restarts skip compiling
+        # them; template files are only re-checked for edits in debug mode
+        template_env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader("storyteller/web/templates"),
+            autoescape=True,
+            auto_reload=bool(self.settings.debug),
+            bytecode_cache=jinja2.FileSystemBytecodeCache()
+        )
+        self.templates = Jinja2Templates(env=template_env)
         
         # Create static directory if it doesn't exist
         static_dir = Path("storyteller/web/static")
         static_dir.mkdir(exist_ok=True)
         
-        self.app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
+        # The directory was just created, so skip StaticFiles' own check
+        self.app.mount(
+            "/static",
+            CachedStaticFiles(directory=str(static_dir), check_dir=False),
+            name="static"
+        )
         
         # Setup routes
         self._setup_routes()
@@ -94,50 +207,24 @@ class WebApplication:
         @self.app.get("/", response_class=HTMLResponse)
         async def dashboard(request: Request):
             """Main dashboard page."""
-            return self.templates.TemplateResponse("dashboard.html", {"request": request})
+            return self.templates.TemplateResponse(request, "dashboard.html")
         
         @self.app.get("/stories", response_class=HTMLResponse)
         async def stories_page(request: Request):
             """Story library page."""
-            return self.templates.TemplateResponse("stories.html", {"request": request})
+            return self.templates.TemplateResponse(request, "stories.html")
         
         @self.app.get("/settings", response_class=HTMLResponse)
         async def settings_page(request: Request):
             """Settings page."""
-            return self.templates.TemplateResponse("settings.html", {"request": request})
+            return self.templates.TemplateResponse(request, "settings.html")
         
         # API routes
         @self.app.get("/api/status", response_model=SystemStatus)
         async def get_status():
             """Get current system status."""
             try:
-                if not self.agent:
-                    return SystemStatus(
-                        state="offline",
-                        is_running=False,
-                        stats={"error": "Agent not initialized"}
-                    )
-                
-                agent_status = self.agent.get_status()
-                
-                # Get hardware status
-                hardware_status = {}
-                if self.agent.hardware_manager:
-                    hardware_status = self.agent.hardware_manager.get_hardware_info()
-                
-                # Get provider status
-                provider_status = {}
-                if self.agent.provider_manager:
-                    provider_status = await self.agent.provider_manager.health_check()
-                
-                return SystemStatus(
-                    state=agent_status.get("state", "unknown"),
-                    is_running=agent_status.get("is_running", False),
-                    current_session=self._format_session_info(agent_status.get("current_session")),
-                    stats=agent_status.get("stats", {}),
-                    hardware_status=hardware_status,
-                    provider_status=provider_status
-                )
+                return await self._get_cached_status()
                 
             except Exception as e:
                 logger.error(f"Status check failed: {e}")
@@ -177,67 +264,46 @@ class WebApplication:
                 logger.error(f"Story creation failed: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
         
-        @self.app.get("/api/stories", response_model=List[SessionInfo])
+        @self.app.get(
+            "/api/stories",
+            response_class=StreamingResponse,
+            responses={200: {"model": List[SessionInfo], "content": {"application/json": {}}}}
+        )
         async def list_stories(limit: int = 20, offset: int = 0):
             """List recent stories."""
+            if not self.story_library:
+                raise HTTPException(status_code=503, detail="Story library not available")
+            
+            # Rows are encoded as they arrive from the database cursor. The
+            # first chunk is read here, before any headers go out, so a
+            # failing query still answers 500 instead of an empty 200.
+            chunks = self._iter_sessions_json(limit, offset)
             try:
-                if not self.story_library:
-                    raise HTTPException(status_code=503, detail="Story library not available")
-                
-                sessions = await self.story_library.get_recent_sessions(limit=limit, offset=offset)
-                
-                return [
-                    SessionInfo(
-                        session_id=session.session_id,
-                        prompt=session.prompt,
-                        language=session.language,
-                        age_rating=session.age_rating,
-                        status=session.status,
-                        created_at=session.created_at,
-                        completed_at=session.completed_at,
-                        paragraphs_generated=session.paragraphs_generated
-                    )
-                    for session in sessions
-                ]
-                
+                first = await anext(chunks)
             except Exception as e:
-                logger.error(f"Story listing failed: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
+            
+            return StreamingResponse(self._resume_stream(first, chunks), media_type="application/json")
         
         @self.app.get("/api/stories/{session_id}", response_model=SessionInfo)
-        async def get_story(session_id: str):
+        async def get_story(session_id: str, library: StoryLibrary = Depends(self.get_story_library)):
             """Get specific story details."""
             try:
-                if not self.story_library:
-                    raise HTTPException(status_code=503, detail="Story library not available")
-                
-                session = await self.story_library.get_session(session_id)
+                session = await library.get_session(session_id)
                 if not session:
                     raise HTTPException(status_code=404, detail="Story not found")
                 
-                return SessionInfo(
-                    session_id=session.session_id,
-                    prompt=session.prompt,
-                    language=session.language,
-                    age_rating=session.age_rating,
-                    status=session.status,
-                    created_at=session.created_at,
-                    completed_at=session.completed_at,
-                    paragraphs_generated=session.paragraphs_generated
-                )
+                return session
                 
             except Exception as e:
                 logger.error(f"Story retrieval failed: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
         
-        @self.app.delete("/api/stories/{session_id}")
-        async def delete_story(session_id: str):
+        @self.app.delete("/api/stories/{session_id}", response_model=MessageResponse)
+        async def delete_story(session_id: str, library: StoryLibrary = Depends(self.get_story_library)):
             """Delete a story."""
             try:
-                if not self.story_library:
-                    raise HTTPException(status_code=503, detail="Story library not available")
-                
-                success = await self.story_library.delete_session(session_id)
+                success = await library.delete_session(session_id)
                 if not success:
                     raise HTTPException(status_code=404, detail="Story not found")
                 
@@ -247,7 +313,7 @@ class WebApplication:
                 logger.error(f"Story deletion failed: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
         
-        @self.app.post("/api/wake")
+        @self.app.post("/api/wake", response_model=MessageResponse)
         async def trigger_wake():
             """Manually trigger wake word detection."""
             try:
@@ -255,13 +321,10 @@ class WebApplication:
                     raise HTTPException(status_code=503, detail="Agent not available")
                 
                 # Simulate wake word detection
-                from ..wakeword.loader import WakewordDetection
-                import time
-                
                 detection = WakewordDetection(
                     keyword="manual_trigger",
                     confidence=1.0,
-                    timestamp=time.time(),
+                    timestamp=time.monotonic_ns(),
                     engine_name="web_interface"
                 )
                 
@@ -273,7 +336,7 @@ class WebApplication:
                 logger.error(f"Wake trigger failed: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
         
-        @self.app.get("/api/settings")
+        @self.app.get("/api/settings", response_model=SettingsInfo)
         async def get_settings_api():
             """Get current settings."""
             try:
@@ -291,7 +354,7 @@ class WebApplication:
                 logger.error(f"Settings retrieval failed: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
         
-        @self.app.post("/api/settings")
+        @self.app.post("/api/settings", response_model=MessageResponse)
         async def update_settings_api(settings_data: Dict[str, Any]):
             """Update settings."""
             try:
@@ -310,55 +373,169 @@ class WebApplication:
         async def websocket_endpoint(websocket: WebSocket):
             """WebSocket endpoint for real-time updates."""
             await websocket.accept()
-            self.websocket_connections.append(websocket)
+            outbox = WebSocketOutbox()
+            self.websocket_connections[websocket] = outbox
+            writer = asyncio.create_task(self._writer(websocket, outbox))
             
             try:
+                # Client frames are not used; read raw messages without
+                # decoding them, only to notice the disconnect. Liveness is
+                # checked by the server's protocol-level pings.
                 while True:
-                    # Keep connection alive
-                    await websocket.receive_text()
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        break
                     
             except Exception as e:
                 logger.debug(f"WebSocket connection closed: {e}")
             finally:
-                if websocket in self.websocket_connections:
-                    self.websocket_connections.remove(websocket)
+                writer.cancel()
+                self.websocket_connections.pop(websocket, None)
+    
+    async def _writer(self, websocket: WebSocket, outbox: WebSocketOutbox):
+        """Deliver broadcast updates to one WebSocket client."""
+        try:
+            await outbox.drain(websocket)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug(f"WebSocket send failed: {e}")
+            self.websocket_connections.pop(websocket, None)
+    
+    @asynccontextmanager
+    async def _story_library_scope(self) -> AsyncIterator[StoryLibrary]:
+        """
+        Provide a StoryLibrary scoped to one request.
+        
+        With a database engine attached, each request gets its own session
+        from the engine's shared factory, so concurrent requests never use
+        the same AsyncSession. Otherwise the application's library is used.
+        """
+        if not self.story_library:
+            raise HTTPException(status_code=503, detail="Story library not available")
+        
+        if self.database_engine is None:
+            yield self.story_library
+            return
+        
+        async with get_session_factory(self.database_engine)() as session:
+            yield StoryLibrary(session, event_writer=self.story_library.event_writer)
+    
+    async def get_story_library(self) -> AsyncIterator[StoryLibrary]:
+        """Dependency providing a request-scoped StoryLibrary."""
+        async with self._story_library_scope() as library:
+            yield library
+    
+    async def _iter_sessions_json(self, limit: int, offset: int) -> AsyncIterator[bytes]:
+        """
+        Yield recent sessions as a JSON array, one encoded row at a time.
+        
+        The first chunk is only produced once the first row (or the end of
+        the result) has been read. Errors are logged and re-raised: once
+        headers are sent that aborts the response, so a failed listing never
+        looks like a complete array.
+        """
+        try:
+            # The session stays open until the last row has been sent
+            async with self._story_library_scope() as library:
+                separator = b"["
+                async for row in library.iter_recent_sessions(limit=limit, offset=offset):
+                    yield separator + dump_session_info(SessionInfo.model_validate(row))
+                    separator = b","
+                yield b"[]" if separator == b"[" else b"]"
+        except Exception as e:
+            logger.error(f"Story listing failed: {e}")
+            raise
+    
+    @staticmethod
+    async def _resume_stream(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Yield an already-read first chunk followed by the rest of the stream."""
+        yield first
+        async for chunk in rest:
+            yield chunk
+    
+    async def _get_cached_status(self) -> SystemStatus:
+        """
+        Get the system status, reusing one assembled within STATUS_CACHE_TTL.
+        
+        Concurrent requests wait for a single build, so a burst of polling
+        clients triggers one round of hardware and provider checks.
+        """
+        cached = self._status_cache
+        if cached is not None and time.monotonic() - cached[0] < STATUS_CACHE_TTL:
+            return cached[1]
+        
+        if self._status_lock is None:
+            self._status_lock = asyncio.Lock()
+        
+        async with self._status_lock:
+            # Another request may have refreshed it while we waited
+            cached = self._status_cache
+            if cached is not None and time.monotonic() - cached[0] < STATUS_CACHE_TTL:
+                return cached[1]
+            
+            status = await self._build_status()
+            self._status_cache = (time.monotonic(), status)
+            return status
+    
+    async def _build_status(self) -> SystemStatus:
+        """Assemble the current system status."""
+        if not self.agent:
+            return SystemStatus(
+                state="offline",
+                is_running=False,
+                stats={"error": "Agent not initialized"}
+            )
+        
+        agent_status = self.agent.get_status()
+        
+        # Get hardware status
+        hardware_status = {}
+        if self.agent.hardware_manager:
+            hardware_status = self.agent.hardware_manager.get_hardware_info()
+        
+        # Get provider status
+        provider_status = {}
+        if self.agent.provider_manager:
+            provider_status = await self.agent.provider_manager.health_check()
+        
+        return SystemStatus(
+            state=agent_status.get("state", "unknown"),
+            is_running=agent_status.get("is_running", False),
+            current_session=self._format_session_info(agent_status.get("current_session")),
+            stats=agent_status.get("stats", {}),
+            hardware_status=hardware_status,
+            provider_status=provider_status
+        )
     
     def _format_session_info(self, session_data: Optional[Dict[str, Any]]) -> Optional[SessionInfo]:
         """Format session data for API response."""
         if not session_data:
             return None
         
-        return SessionInfo(
-            session_id=session_data.get("session_id", ""),
-            prompt=session_data.get("prompt", ""),
-            language=session_data.get("language", "tr"),
-            age_rating=session_data.get("age_rating", "5+"),
-            status=session_data.get("status", "unknown"),
-            created_at=session_data.get("created_at", datetime.now()),
-            completed_at=session_data.get("completed_at"),
-            paragraphs_generated=session_data.get("paragraphs_generated", 0)
-        )
+        # The agent's session dict uses SessionInfo's field names
+        return SessionInfo.model_validate(session_data)
     
     async def _broadcast_update(self, message: Dict[str, Any]):
-        """Broadcast update to all WebSocket connections."""
+        """
+        Broadcast update to all WebSocket connections.
+        
+        The message is serialized once and queued for every client; each
+        client's writer task sends it, so slow clients do not hold up others.
+        """
         if not self.websocket_connections:
             return
         
-        disconnected = []
-        for websocket in self.websocket_connections:
-            try:
-                await websocket.send_json(message)
-            except Exception:
-                disconnected.append(websocket)
-        
-        # Remove disconnected WebSocket connections
-        for websocket in disconnected:
-            self.websocket_connections.remove(websocket)
+        payload = orjson.dumps(message)
+        for outbox in self.websocket_connections.values():
+            outbox.put(payload)
     
-    async def initialize(self, agent: StorytellingAgent, story_library: StoryLibrary):
+    async def initialize(self, agent: StorytellingAgent, story_library: StoryLibrary, database_engine=None):
         """Initialize web application with agent and story library."""
         self.agent = agent
         self.story_library = story_library
+        self.database_engine = database_engine
+        self._status_cache = None
         
         # Setup agent callbacks for WebSocket updates
         if self.agent:
@@ -367,6 +544,7 @@ class WebApplication:
             original_on_story_completed = getattr(self.agent, 'on_story_completed', None)
             
             async def on_state_change(new_state):
+                self._status_cache = None
                 await self._broadcast_update({
                     "type": "state_change",
                     "state": new_state.value
@@ -405,12 +583,41 @@ def create_app() -> FastAPI:
     """Create and return FastAPI application."""
     return web_app.app
 
+def server_backends() -> Dict[str, str]:
+    """
+    Pick the fastest installed Uvicorn backends.
+    
+    uvloop, httptools and websockets come with uvicorn[standard] but are
+    optional (uvloop does not exist on Windows). Each one is pinned only
+    when it is importable; otherwise uvicorn's "auto" choice is kept, which
+    falls back to asyncio and h11.
+    
+    Returns:
+        Dict[str, str]: uvicorn options (loop, http, ws) to pin
+    """
+    backends = {}
+    for option, module in (("loop", "uvloop"), ("http", "httptools"), ("ws", "websockets")):
+        if importlib.util.find_spec(module) is not None:
+            backends[option] = module
+    return backends
+
 def run_server(host: str = "0.0.0.0", port: int = 5000, **kwargs):
-    """Run the web server."""
+    """
+    Run the web server.
+    
+    Uses uvloop, the httptools parser and websockets when they are installed
+    (see server_backends); pass loop, http or ws explicitly to override
+    them.
+    """
+    for option, backend in server_backends().items():
+        kwargs.setdefault(option, backend)
+    kwargs.setdefault("ws_ping_interval", WS_PING_INTERVAL)
+    kwargs.setdefault("ws_ping_timeout", WS_PING_TIMEOUT)
+    kwargs.setdefault("interface", "asgi3")
     uvicorn.run(
         "storyteller.web.app:create_app",
         host=host,
         port=port,
         factory=True,
         **kwargs
-    )
\ No newline at end of file
+    )
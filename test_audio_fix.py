@@ -11,6 +11,8 @@ import sys
 # Add the storyteller module to path
 sys.path.insert(0, '.')
 
+from storyteller.utils.event_loop import run_async
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -113,16 +115,17 @@ async def main():
     logger.info("🧪 Starting Bedtime Storyteller Audio Fix Tests")
     logger.info("=" * 60)
     
-    results = []
+    tests = {
+        "Audio Device Initialization": test_audio_initialization(),
+        "Main Application Initialization": test_main_app_initialization(),
+    }
     
-    # Test 1: Audio initialization
-    logger.info("Test 1: Audio Device Initialization")
-    results.append(await test_audio_initialization())
-    logger.info("-" * 40)
+    # The tests share no state, so run them concurrently
+    outcomes = await asyncio.gather(*tests.values(), return_exceptions=True)
+    results = [outcome is True for outcome in outcomes]
     
-    # Test 2: Main application initialization
-    logger.info("Test 2: Main Application Initialization")
-    results.append(await test_main_app_initialization())
+    for name, passed in zip(tests, results):
+        logger.info(f"{name}: {'PASSED' if passed else 'FAILED'}")
     logger.info("-" * 40)
     
     # Summary
@@ -140,5 +143,5 @@ async def main():
         return 1
 
 if __name__ == "__main__":
-    exit_code = asyncio.run(main())
+    exit_code = run_async(main())
     sys.exit(exit_code)
\ No newline at end of file
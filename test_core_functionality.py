@@ -11,6 +11,8 @@ import sys
 # Add the storyteller module to path
 sys.path.insert(0, '.')
 
+from storyteller.utils.event_loop import run_async
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -167,21 +169,18 @@ async def main():
     logger.info("🧪 Starting Core Functionality Tests")
     logger.info("=" * 60)
     
-    results = []
-    
-    # Test 1: Core initialization
-    logger.info("Test 1: Core System Initialization")
-    results.append(await test_core_initialization())
-    logger.info("-" * 40)
+    tests = {
+        "Core System Initialization": test_core_initialization(),
+        "Mock Story Session": test_mock_story_session(),
+        "Database Functionality": test_database_functionality(),
+    }
     
-    # Test 2: Mock story session
-    logger.info("Test 2: Mock Story Session")
-    results.append(await test_mock_story_session())
-    logger.info("-" * 40)
+    # The tests share no state, so run them concurrently
+    outcomes = await asyncio.gather(*tests.values(), return_exceptions=True)
+    results = [outcome is True for outcome in outcomes]
     
-    # Test 3: Database functionality
-    logger.info("Test 3: Database Functionality")
-    results.append(await test_database_functionality())
+    for name, passed in zip(tests, results):
+        logger.info(f"{name}: {'PASSED' if passed else 'FAILED'}")
     logger.info("-" * 40)
     
     # Summary
@@ -199,5 +198,5 @@ async def main():
         return 1
 
 if __name__ == "__main__":
-    exit_code = asyncio.run(main())
+    exit_code = run_async(main())
     sys.exit(exit_code)
\ No newline at end of file
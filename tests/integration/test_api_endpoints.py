@@ -44,8 +44,12 @@ def mock_agent():
 @pytest.fixture
 def mock_story_library():
     """Provides a mock StoryLibrary."""
+    async def no_sessions(**kwargs):
+        return
+        yield
+
     library = MagicMock(spec=StoryLibrary)
-    library.get_recent_sessions = AsyncMock(return_value=[])
+    library.iter_recent_sessions = MagicMock(side_effect=no_sessions)
     return library
 
 @pytest.fixture
@@ -87,8 +91,8 @@ def test_list_stories_endpoint(client, mock_story_library):
     
     assert response.status_code == 200
     
-    # Verify that get_recent_sessions was called with the correct arguments
-    mock_story_library.get_recent_sessions.assert_called_once_with(limit=10, offset=5)
+    # Verify that iter_recent_sessions was called with the correct arguments
+    mock_story_library.iter_recent_sessions.assert_called_once_with(limit=10, offset=5)
     
     # Check the response body
     assert response.json() == []
\ No newline at end of file
@@ -26,7 +26,11 @@ def web_app_fixture():
 
     # Mock the story library
     app.story_library = AsyncMock(spec=StoryLibrary)
-    app.story_library.get_recent_sessions.return_value = []
+    async def no_sessions(**kwargs):
+        return
+        yield
+
+    app.story_library.iter_recent_sessions = MagicMock(side_effect=no_sessions)
 
     return app
 
@@ -59,7 +63,7 @@ async def test_get_status_endpoint_calls_get_hardware_info(web_app_fixture):
 @pytest.mark.asyncio
 async def test_list_stories_endpoint_handles_offset(web_app_fixture):
     """
-    Verifies that the /api/stories endpoint correctly calls get_recent_sessions
+    Verifies that the /api/stories endpoint correctly calls iter_recent_sessions
     with both limit and offset parameters.
     """
     # GIVEN a web app with a mocked StoryLibrary
@@ -68,13 +72,14 @@ async def test_list_stories_endpoint_handles_offset(web_app_fixture):
     # WHEN the /api/stories endpoint is called with an offset
     list_stories_func = None
     for route in app.app.routes:
-        if route.path == "/api/stories" and "get" in route.methods:
+        if route.path == "/api/stories" and "GET" in route.methods:
             list_stories_func = route.endpoint
             break
             
     assert list_stories_func is not None, "Could not find GET /api/stories route"
 
-    await list_stories_func(limit=10, offset=5)
+    response = await list_stories_func(limit=10, offset=5)
+    assert b"".join([chunk async for chunk in response.body_iterator]) == b"[]"
 
-    # THEN the get_recent_sessions method should be called with the correct offset
-    app.story_library.get_recent_sessions.assert_called_once_with(limit=10, offset=5)
+    # THEN the iter_recent_sessions method should be called with the correct offset
+    app.story_library.iter_recent_sessions.assert_called_once_with(limit=10, offset=5)
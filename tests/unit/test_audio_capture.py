@@ -0,0 +1,115 @@
+"""
+Unit tests for wakeword audio capture.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from storyteller.wakeword.audio_capture import (
+    AudioFrameReader,
+    PA_CONTINUE,
+    aligned_frames_per_buffer,
+    find_input_device,
+)
+
+
+def run_on_audio_thread(reader, frames):
+    """Invoke the stream callback from another thread, like PortAudio does."""
+    def deliver():
+        for frame in frames:
+            assert reader.on_audio(frame, len(frame) // 2, {}, 0) == (None, PA_CONTINUE)
+
+    thread = threading.Thread(target=deliver)
+    thread.start()
+    thread.join()
+
+
+@pytest.mark.asyncio
+async def test_frames_delivered_in_order():
+    """Frames from the audio thread arrive on the event loop in order."""
+    reader = AudioFrameReader()
+    reader.start()
+
+    run_on_audio_thread(reader, [b"\x01\x00", b"\x02\x00"])
+
+    assert await reader.read() == b"\x01\x00"
+    assert await reader.read() == b"\x02\x00"
+
+
+@pytest.mark.asyncio
+async def test_oldest_frame_dropped_when_full():
+    """A slow consumer gets the newest frames."""
+    reader = AudioFrameReader(max_queued=2)
+    reader.start()
+
+    run_on_audio_thread(reader, [b"\x01\x00", b"\x02\x00", b"\x03\x00"])
+    await asyncio.sleep(0)
+
+    assert await reader.read() == b"\x02\x00"
+    assert await reader.read() == b"\x03\x00"
+
+
+@pytest.mark.asyncio
+async def test_stop_wakes_reader():
+    """Stopping ends a pending read with None and ignores late frames."""
+    reader = AudioFrameReader()
+    reader.start()
+    pending = asyncio.create_task(reader.read())
+    await asyncio.sleep(0)
+
+    await reader.stop()
+    run_on_audio_thread(reader, [b"\x01\x00"])
+
+    assert await pending is None
+    assert reader._queue.empty()
+
+
+class FakePyAudio:
+    """PyAudio stand-in that counts device queries."""
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.queries = 0
+
+    def get_device_count(self):
+        return len(self.devices)
+
+    def get_device_info_by_index(self, index):
+        self.queries += 1
+        name, channels = self.devices[index]
+        return {"name": name, "maxInputChannels": channels}
+
+
+@pytest.mark.parametrize("devices, expected", [
+    ([("HDMI", 0), ("Mic Array", 2), ("USB PnP Sound Device", 1)], 2),
+    ([("HDMI", 0), ("Mic Array", 2), ("Line In", 1)], 1),
+    ([("HDMI", 0)], 0),
+])
+def test_find_input_device(devices, expected):
+    """Preferred devices win, then the first input device; each is queried once."""
+    audio = FakePyAudio(devices)
+    assert find_input_device(audio) == expected
+    assert audio.queries <= len(devices)
+
+
+@pytest.mark.asyncio
+async def test_large_buffers_split_into_frames():
+    """A PortAudio buffer spanning several engine frames is delivered frame by frame."""
+    reader = AudioFrameReader(frame_bytes=2)
+    reader.start()
+
+    run_on_audio_thread(reader, [b"\x01\x00\x02\x00\x03\x00"])
+
+    frames = [await reader.read() for _ in range(3)]
+    assert [bytes(frame) for frame in frames] == [b"\x01\x00", b"\x02\x00", b"\x03\x00"]
+    assert all(isinstance(frame, memoryview) for frame in frames)
+
+
+@pytest.mark.parametrize("latency, expected", [(0.008, 512), (0.05, 1024), (0.1, 2048), (10.0, 4096)])
+def test_aligned_frames_per_buffer(latency, expected):
+    """Buffers cover the device latency in power-of-two multiples of the frame."""
+    audio = FakePyAudio([("USB Mic", 1)])
+    audio.get_device_info_by_index = lambda index: {"defaultLowInputLatency": latency}
+    assert aligned_frames_per_buffer(audio, 0, 512, 16000) == expected
@@ -0,0 +1,43 @@
+"""
+Unit tests for audio utilities.
+"""
+
+import pytest
+
+from storyteller.utils.audio_utils import calculate_audio_duration, validate_audio_format
+
+
+class TestCalculateAudioDuration:
+    """Test audio duration calculation."""
+
+    def test_pcm16_mono(self):
+        """One second of 16 kHz PCM16 mono is 32000 bytes."""
+        assert calculate_audio_duration(b"\x00" * 32000, 16000) == pytest.approx(1.0)
+
+    def test_partial_frame_ignored(self):
+        """Trailing bytes that do not fill a frame are not counted."""
+        assert calculate_audio_duration(b"\x00" * 32003, 16000, channels=2) == pytest.approx(0.5)
+
+    @pytest.mark.parametrize("sample_rate, channels, sample_width", [(0, 1, 2), (16000, 0, 2), (16000, 1, 0)])
+    def test_zero_format_values(self, sample_rate, channels, sample_width):
+        """Degenerate formats return zero instead of raising."""
+        assert calculate_audio_duration(b"\x00" * 100, sample_rate, channels, sample_width) == 0.0
+
+
+class TestValidateAudioFormat:
+    """Test audio format validation."""
+
+    @pytest.mark.parametrize("audio_data, expected", [
+        (b"", False),
+        (b"\x00" * 98, False),
+        (b"\x00" * 100, True),
+        (b"\x00" * 101, False),
+        (memoryview(b"\x00" * 200), True),
+    ])
+    def test_pcm16(self, audio_data, expected):
+        """PCM16 needs at least 100 bytes and an even length."""
+        assert validate_audio_format(audio_data) is expected
+
+    def test_other_formats_only_check_length(self):
+        """Non-PCM formats accept odd lengths."""
+        assert validate_audio_format(b"\x00" * 101, expected_format="mp3") is True
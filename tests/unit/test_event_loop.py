@@ -0,0 +1,31 @@
+"""
+Unit tests for event loop selection.
+"""
+
+import asyncio
+import builtins
+
+from storyteller.utils.event_loop import run_async
+
+
+async def answer():
+    await asyncio.sleep(0)
+    return 42
+
+
+def test_run_async_returns_result():
+    """The coroutine's result is returned, whichever loop runs it."""
+    assert run_async(answer()) == 42
+
+
+def test_run_async_without_uvloop(monkeypatch):
+    """Falls back to the default asyncio loop when uvloop is missing."""
+    real_import = builtins.__import__
+
+    def fake_import(name, *args, **kwargs):
+        if name == "uvloop":
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", fake_import)
+    assert run_async(answer()) == 42
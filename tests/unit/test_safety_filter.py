@@ -2,6 +2,8 @@
 Unit tests for safety filter system.
 """
 
+import sys
+
 import pytest
 from storyteller.utils.safety_filter import SafetyFilter, SafetyViolation
 
@@ -86,3 +88,76 @@ async def test_turkish_unsafe_prompt(safety_filter_tr):
     assert "korkunç" not in filtered_prompt
     assert "canavar" not in filtered_prompt
     assert "eğlenceli" in filtered_prompt or "sevimli hayvan" in filtered_prompt
+
+def test_forbidden_words_reported_once_per_category(safety_filter_tr):
+    """Each forbidden word is reported once per category, including overlapping matches."""
+    violations = safety_filter_tr._check_safety_violations("Kavga, kavga! Korkunç bir gece.")
+    found = [(v.category, v.original_text) for v in violations if v.category != "pattern"]
+    assert found.count(("violence", "kavga")) == 1
+    assert found.count(("inappropriate", "kavga")) == 1
+    # "korku" is reported alongside the longer "korkunç" it is part of
+    assert ("violence", "korku") in found
+    assert ("violence", "korkunç") in found
+
+def test_positive_themes_counted_once(safety_filter_en):
+    """Positive themes count distinct themes, not occurrences."""
+    rating = safety_filter_en.get_content_rating("Friendship and more friendship, love and family.")
+    assert rating["positive_themes"] == 3
+
+def test_problematic_patterns_single_scan(safety_filter_en):
+    """Pattern matches report the matched theme and ignore words that only contain it."""
+    violations = safety_filter_en._check_safety_violations("The warrior felt painful, not unwary.")
+    patterns = [v.description for v in violations if v.category == "pattern"]
+    assert patterns == [
+        "Contains problematic pattern (war): warrior",
+        "Contains problematic pattern (pain): painful",
+    ]
+
+def test_enhanced_prompt_templates(safety_filter_en, safety_filter_tr):
+    """Prompt templates are filled with the target age and language."""
+    enhanced_en = safety_filter_en._enhance_prompt_with_safety("a sleepy owl")
+    assert "for a 5-year-old child" in enhanced_en
+    assert "Story topic: a sleepy owl\n" in enhanced_en
+
+    enhanced_tr = safety_filter_tr._enhance_prompt_with_safety("uykulu bir baykuş")
+    assert "5 yaşındaki" in enhanced_tr
+    assert "Hikaye konusu: uykulu bir baykuş\n" in enhanced_tr
+
+    assert "cute animals" in safety_filter_en._get_default_safe_prompt()
+    assert "sevimli hayvanlar" in safety_filter_tr._get_default_safe_prompt()
+
+def test_apply_safety_filters_single_pass(safety_filter_en):
+    """Replacements and whole-word removals are applied in one rewrite."""
+    text = "The poor Monster had money, a moneybag and a Fight"
+    violations = safety_filter_en._check_safety_violations(text)
+    filtered = safety_filter_en._apply_safety_filters(text, violations)
+    assert filtered == "The sevimli hayvan had , a moneybag and a oyun oyna"
+
+@pytest.mark.parametrize("content", [
+    "The little cat played in the garden.",
+    "Money and stress made the rich man angry.",
+    "Money made him angry.",
+    "A fearful knight met a dragon.",
+])
+def test_count_violations_matches_check(safety_filter_en, content):
+    """Counting agrees with the full violation check."""
+    violations = safety_filter_en._check_safety_violations(content)
+    high_count, medium_count = safety_filter_en._count_violations(content.lower())
+    if any(v.severity == "high" for v in violations):
+        assert high_count == 1
+    else:
+        assert high_count == 0
+        assert medium_count == sum(v.severity == "medium" for v in violations)
+
+@pytest.mark.skipif(sys.version_info < (3, 10), reason="slotted dataclasses need Python 3.10")
+def test_safety_violation_has_no_instance_dict():
+    """Violations are slotted to keep long stories cheap to rate."""
+    violation = SafetyViolation("violence", "Contains forbidden word: war", "high", "war")
+    assert violation.suggested_replacement is None
+    assert not hasattr(violation, "__dict__")
+
+def test_filters_share_word_tables(safety_filter_en, safety_filter_tr):
+    """Word tables and automatons are built once for all filters."""
+    assert safety_filter_en.forbidden_words is safety_filter_tr.forbidden_words
+    assert safety_filter_en._forbidden_automaton is safety_filter_tr._forbidden_automaton
+    assert safety_filter_en._positive_theme_automaton is safety_filter_tr._positive_theme_automaton
@@ -0,0 +1,898 @@
+"""
+Unit tests for the SQLite storage layer.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from pydantic import ValidationError
+from sqlalchemy import create_mock_engine, event, func, inspect, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.schema import CreateIndex
+
+from storyteller.storage.event_writer import EventWriter, archive_events_by_day
+from storyteller.storage.models import (
+    Base, ScheduledStoryCreate, SessionCreate, SessionResponse, Story, StoryCreate, StorySession, SystemEvent, StoryDetailResponse, StoryListResponse, StoryTheme, StoryUpdate,
+    UserPreferences, create_database_engine, create_tables, get_database_session,
+    get_session_factory, init_default_preferences, story_search_vector
+)
+from storyteller.storage.story_library import StoryLibrary
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    """Provides a file-backed SQLite engine with tables created."""
+    engine = await create_database_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    await create_tables(engine)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pragmas_applied_on_connect(engine):
+    """Every new connection should run in WAL mode with NORMAL sync."""
+    async with engine.connect() as conn:
+        journal_mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+        synchronous = (await conn.execute(text("PRAGMA synchronous"))).scalar()
+        busy_timeout = (await conn.execute(text("PRAGMA busy_timeout"))).scalar()
+
+    assert journal_mode == "wal"
+    assert synchronous == 1  # NORMAL
+    assert busy_timeout == 5000
+
+
+@pytest.mark.asyncio
+async def test_session_factory_is_reused_per_engine(engine):
+    """Sessions for the same engine should come from one cached factory."""
+    assert get_session_factory(engine) is get_session_factory(engine)
+
+    session = await get_database_session(engine)
+    try:
+        assert session.bind is engine
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_init_default_preferences_is_idempotent(engine):
+    """Running the default preference setup twice should not duplicate keys."""
+    session = await get_database_session(engine)
+    try:
+        await init_default_preferences(session)
+        await init_default_preferences(session)
+
+        result = await session.execute(select(func.count(UserPreferences.id)))
+        count = result.scalar()
+        result = await session.execute(
+            select(UserPreferences.value).where(UserPreferences.key == "default_language")
+        )
+        assert result.scalar_one() == "tr"
+    finally:
+        await session.close()
+
+    assert count == 9
+
+
+@pytest.mark.asyncio
+async def test_file_database_uses_connection_pool(engine):
+    """File-backed SQLite engines should keep pooled connections open."""
+    assert isinstance(engine.pool, AsyncAdaptedQueuePool)
+    assert engine.pool.size() == 5
+
+    async with engine.connect() as conn:
+        first = (await conn.get_raw_connection()).driver_connection
+    async with engine.connect() as conn:
+        second = (await conn.get_raw_connection()).driver_connection
+    assert first is second
+
+
+@pytest.mark.asyncio
+async def test_favorite_feed_query_uses_composite_index(engine):
+    """The favorites feed should be served by the composite index without a sort."""
+    async with engine.connect() as conn:
+        plan = (await conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM stories "
+            "WHERE is_favorite = 1 ORDER BY created_at DESC"
+        ))).all()
+
+    details = " ".join(row[-1] for row in plan)
+    assert "idx_story_fav_created" in details
+    assert "TEMP B-TREE" not in details
+
+
+@pytest.mark.asyncio
+async def test_story_themes_side_table_tracks_story_themes(engine):
+    """Creating and updating a story should keep story_themes in sync."""
+    session = await get_database_session(engine)
+    try:
+        story = Story(title="Kedi", content="Bir varmış bir yokmuş.", themes=["dostluk", "doğa"])
+        session.add(story)
+        await session.commit()
+
+        result = await session.execute(
+            select(StoryTheme.theme).where(StoryTheme.story_id == story.id)
+        )
+        assert set(result.scalars().all()) == {"dostluk", "doğa"}
+
+        result = await session.execute(select(Story.theme_primary).where(Story.id == story.id))
+        assert result.scalar_one() == "dostluk"
+
+        query = select(Story.id).where(Story.theme_primary == "dostluk")
+        compiled = query.compile(session.bind, compile_kwargs={"literal_binds": True})
+        plan = (await session.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+        assert "idx_story_theme_primary" in " ".join(row[-1] for row in plan)
+
+        story.themes = ["macera"]
+        await session.commit()
+
+        result = await session.execute(
+            select(StoryTheme.theme).where(StoryTheme.story_id == story.id)
+        )
+        assert result.scalars().all() == ["macera"]
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_create_tables_adds_missing_columns(tmp_path):
+    """Databases created before a column existed should be upgraded in place."""
+    engine = await create_database_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE stories (id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, "
+                "content TEXT NOT NULL, themes JSON)"
+            ))
+
+        await create_tables(engine)
+
+        async with engine.connect() as conn:
+            columns = {row[1] for row in await conn.execute(text("PRAGMA table_xinfo(stories)"))}
+            indexes = {row[1] for row in await conn.execute(text("PRAGMA index_list(stories)"))}
+        assert "is_favorite" in columns
+        assert "idx_story_theme_primary" in indexes
+    finally:
+        await engine.dispose()
+
+
+def test_sqlite_only_schema_skipped_on_postgresql():
+    """create_all on PostgreSQL must not emit SQLite-only functions."""
+    statements = []
+    mock_engine = create_mock_engine(
+        "postgresql+psycopg2://",
+        lambda sql, *args, **kwargs: statements.append(str(sql.compile(dialect=mock_engine.dialect))),
+    )
+    Base.metadata.create_all(mock_engine, checkfirst=False)
+
+    ddl = "\n".join(statements)
+    assert "CREATE TABLE stories" in ddl
+    assert "json_extract" not in ddl
+    assert "idx_story_theme_primary" not in ddl
+
+
+@pytest.mark.asyncio
+async def test_word_count_computed_by_database(engine):
+    """word_count and estimated_duration should be derived from the content."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        story = await library.create_story(StoryCreate(
+            title="Kedi",
+            content="Bir varmış bir yokmuş.\nKüçük bir kedi varmış.",
+        ))
+        assert story.word_count == 8
+        assert story.estimated_duration == pytest.approx(8 / 80)
+
+        updated = await library.update_story(story.id, StoryUpdate(content="Kedi uyudu ve rüya gördü."))
+        assert updated.word_count == 5
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("content", [
+    "Kedi uyudu.\n",
+    "\n",
+    "Kedi.\n\nSon.",
+    "Bir\tiki üç",
+    "  Bir varmış\r\n\r\nbir yokmuş.\n\n\tKüçük   bir kedi varmış. \n",
+])
+async def test_word_count_matches_whitespace_split(engine, content):
+    """Line breaks, blank lines, tabs and padding must not change the count."""
+    session = await get_database_session(engine)
+    try:
+        story = Story(title="Kedi", content=content)
+        session.add(story)
+        await session.commit()
+
+        row = (await session.execute(
+            select(Story.word_count, Story.estimated_duration).where(Story.id == story.id)
+        )).one()
+        assert row.word_count == len(content.split())
+        assert row.estimated_duration == pytest.approx(len(content.split()) / 80)
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_create_tables_replaces_outdated_word_count_triggers(engine):
+    """Upgrading should swap old trigger definitions and recount stories."""
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TRIGGER stories_word_count_insert"))
+        await conn.execute(text(
+            "CREATE TRIGGER stories_word_count_insert AFTER INSERT ON stories "
+            "BEGIN UPDATE stories SET word_count = -1 WHERE id = NEW.id; END"
+        ))
+
+    session = await get_database_session(engine)
+    try:
+        session.add(Story(title="Kedi", content="Kedi.\n\nSon."))
+        await session.commit()
+    finally:
+        await session.close()
+
+    await create_tables(engine)
+
+    async with engine.connect() as conn:
+        word_count = (await conn.execute(text("SELECT word_count FROM stories"))).scalar_one()
+    assert word_count == 2
+
+
+@pytest.mark.asyncio
+async def test_summary_is_stored_compressed(engine):
+    """Summaries round-trip through the compressed BLOB column."""
+    summary = "Küçük kedi yıldızları saydı ve uyudu. " * 20
+    session = await get_database_session(engine)
+    try:
+        story = Story(title="Kedi", content="Bir varmış bir yokmuş.", summary=summary)
+        session.add(story)
+        await session.commit()
+        session.expunge_all()
+
+        result = await session.execute(select(Story.summary).where(Story.id == story.id))
+        assert result.scalar_one() == summary
+
+        raw = await session.execute(text("SELECT summary FROM stories"))
+        stored = raw.scalar_one()
+        assert isinstance(stored, bytes)
+        assert len(stored) < len(summary.encode("utf-8"))
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_story_body_is_deferred_for_list_queries(engine):
+    """List queries skip the story body; get_story loads it."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        story = await library.create_story(StoryCreate(title="Kedi", content="Bir varmış bir yokmuş."))
+        session.expunge_all()
+
+        stories, total = await library.search_stories()
+        assert total == 1
+        assert "content" not in inspect(stories[0]).dict
+        assert StoryListResponse.model_validate(stories[0]).title == "Kedi"
+        session.expunge_all()
+
+        detail = await library.get_story(story.id)
+        assert StoryDetailResponse.model_validate(detail).content == "Bir varmış bir yokmuş."
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_schedule_days_stored_as_bitmask(engine):
+    """Schedules keep their weekdays as a bitmask and can be filtered by day."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        schedule = await library.create_scheduled_story(ScheduledStoryCreate(
+            name="Uyku zamanı",
+            prompt="Bir kedi hikayesi",
+            schedule_time="20:30",
+            days_of_week=[3, 0, 3],
+        ))
+        assert schedule.days_mask == 0b0001001
+        assert schedule.days_of_week == [0, 3]
+
+        assert [s.id for s in await library.get_active_schedules(weekday=3)] == [schedule.id]
+        assert await library.get_active_schedules(weekday=2) == []
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_event_metadata_round_trips_as_msgpack(engine):
+    """Event metadata is stored as msgpack and legacy JSON rows still decode."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        await library.log_event("wake_word", "Detected", metadata={"keyword": "hey", "score": 0.9})
+        await session.execute(text(
+            "INSERT INTO system_events (event_type, message, event_metadata, timestamp) "
+            "VALUES ('legacy', 'Old row', '{\"source\": \"json\"}', CURRENT_TIMESTAMP)"
+        ))
+        await session.commit()
+        session.expunge_all()
+
+        result = await session.execute(
+            select(SystemEvent.event_type, SystemEvent.event_metadata).order_by(SystemEvent.id)
+        )
+        assert result.all() == [
+            ("wake_word", {"keyword": "hey", "score": 0.9}),
+            ("legacy", {"source": "json"}),
+        ]
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_preference_reads_are_cached_until_written(engine):
+    """get_preference serves repeat reads from memory and set_preference invalidates."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        await library.set_preference("default_volume", 0.5)
+        assert await library.get_preference("default_volume") == 0.5
+
+        # A write that bypasses the library is not seen until the entry expires
+        await session.execute(text("UPDATE user_preferences SET value = '0.9'"))
+        await session.commit()
+        assert await library.get_preference("default_volume") == 0.5
+
+        await library.set_preference("default_volume", 0.8)
+        assert await library.get_preference("default_volume") == 0.8
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_import_stories_validates_whole_batch(engine):
+    """import_stories accepts raw JSON and rejects the batch on any invalid item."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        stories = await library.import_stories(
+            b'[{"title": "Kedi", "content": "Bir varmis bir yokmus."},'
+            b' {"title": "Kopek", "content": "Kucuk kopek uyudu.", "language": "en"}]'
+        )
+        assert [story.title for story in stories] == ["Kedi", "Kopek"]
+        assert [story.word_count for story in stories] == [4, 3]
+        assert all(story.estimated_duration > 0 for story in stories)
+        assert StoryDetailResponse.model_validate(stories[0]).content == "Bir varmis bir yokmus."
+
+        with pytest.raises(ValidationError):
+            await library.import_stories([{"title": "Kisa", "content": "kisa"}])
+
+        result = await session.execute(select(func.count(Story.id)))
+        assert result.scalar() == 2
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_list_stories_returns_list_responses(engine):
+    """list_stories returns validated list models, newest first, filtered by favorite."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        first = await library.create_story(StoryCreate(title="Kedi", content="Bir varmış bir yokmuş."))
+        await library.create_story(StoryCreate(title="Köpek", content="Küçük köpek uyudu."))
+        await library.update_story(first.id, StoryUpdate(is_favorite=True))
+
+        stories = await library.list_stories()
+        assert all(isinstance(story, StoryListResponse) for story in stories)
+        assert {story.title for story in stories} == {"Kedi", "Köpek"}
+
+        favorites = await library.list_stories(is_favorite=True)
+        assert [story.id for story in favorites] == [first.id]
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_event_writer_batches_queued_events(engine):
+    """Events logged through the writer are committed in batches and flushed on stop."""
+    writer = EventWriter(engine, batch_size=4)
+    await writer.start()
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session, event_writer=writer)
+        for i in range(10):
+            await library.log_event("tick", f"Event {i}", metadata={"i": i})
+        assert not session.in_transaction()
+
+        await writer.stop()
+
+        result = await session.execute(select(SystemEvent.event_metadata).order_by(SystemEvent.id))
+        assert [row["i"] for row in result.scalars().all()] == list(range(10))
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_old_events_archived_into_daily_shards(engine, tmp_path):
+    """Events past the retention window move into per-day shard databases."""
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO system_events (event_type, message, timestamp) VALUES "
+            "('old', 'a', '2024-01-15 08:00:00'), ('old', 'b', '2024-01-15 21:30:00'), "
+            "('old', 'c', '2024-01-16 09:00:00'), ('new', 'd', CURRENT_TIMESTAMP)"
+        ))
+
+    assert await archive_events_by_day(engine, keep_days=7) == 3
+
+    async with engine.connect() as conn:
+        remaining = (await conn.execute(text("SELECT event_type FROM system_events"))).scalars().all()
+        assert remaining == ["new"]
+
+        await conn.execute(text("ATTACH DATABASE :path AS shard"), {"path": str(tmp_path / "events_20240115.db")})
+        archived = (await conn.execute(text("SELECT message FROM shard.system_events ORDER BY id"))).scalars().all()
+        assert archived == ["a", "b"]
+        await conn.execute(text("DETACH DATABASE shard"))
+
+    assert (tmp_path / "events_20240116.db").exists()
+
+
+@pytest.mark.asyncio
+async def test_failed_archive_keeps_events_and_reports_real_error(engine, tmp_path, caplog):
+    """A shard that cannot take the rows should leave them in place and log why."""
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO system_events (event_type, message, timestamp) "
+            "VALUES ('old', 'a', '2024-01-15 08:00:00')"
+        ))
+    async with engine.connect() as conn:
+        await conn.execute(text("ATTACH DATABASE :path AS shard"), {"path": str(tmp_path / "events_20240115.db")})
+        await conn.execute(text(
+            "CREATE TABLE shard.system_events AS SELECT * FROM main.system_events"
+        ))
+        await conn.execute(text("CREATE UNIQUE INDEX shard.idx_shard_event_id ON system_events (id)"))
+        await conn.commit()
+        await conn.execute(text("DETACH DATABASE shard"))
+
+    assert await archive_events_by_day(engine, keep_days=7) == 0
+    assert "UNIQUE constraint failed" in caplog.text
+    assert "locked" not in caplog.text
+
+    async with engine.connect() as conn:
+        remaining = (await conn.execute(text("SELECT message FROM system_events"))).scalars().all()
+        assert remaining == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_event_writer_falls_back_to_async_connection_in_memory():
+    """In-memory databases cannot be reopened, so the writer shares the async engine."""
+    engine = await create_database_engine("sqlite+aiosqlite:///:memory:")
+    try:
+        await create_tables(engine)
+        writer = EventWriter(engine)
+        await writer.start()
+        writer.enqueue("tick", "In memory")
+        await writer.stop()
+
+        async with engine.connect() as conn:
+            result = await conn.execute(select(SystemEvent.message))
+            assert result.scalars().all() == ["In memory"]
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_trigram_indexes_only_created_on_postgresql(engine):
+    """Trigram GIN indexes compile for PostgreSQL and are skipped on SQLite."""
+    async with engine.connect() as conn:
+        indexes = await conn.run_sync(lambda c: {i["name"] for i in inspect(c).get_indexes("stories")})
+    assert not any(name.endswith("_trgm") for name in indexes)
+
+    trgm = next(i for i in Story.__table__.indexes if i.name == "idx_story_title_trgm")
+    ddl = str(CreateIndex(trgm).compile(dialect=postgresql.dialect()))
+    assert "USING gin (title gin_trgm_ops)" in ddl
+
+
+@pytest.mark.asyncio
+async def test_word_search_uses_full_text_index(engine):
+    """Word queries match through FTS5, including prefixes and edits; others use LIKE."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        cat = await library.create_story(StoryCreate(title="Kedi", content="Küçük kedi yıldızları saydı."))
+        await library.create_story(StoryCreate(title="Köpek", content="Küçük köpek 100% uyudu."))
+
+        stories, total = await library.search_stories(query="yıldız")
+        assert (total, [s.id for s in stories]) == (1, [cat.id])
+
+        stories, total = await library.search_stories(query="küçük")
+        assert total == 2
+
+        await library.update_story(cat.id, StoryUpdate(content="Küçük kedi ay ışığında uyudu."))
+        stories, total = await library.search_stories(query="yıldız")
+        assert total == 0
+
+        stories, total = await library.search_stories(query="100%")
+        assert [s.title for s in stories] == ["Köpek"]
+    finally:
+        await session.close()
+
+
+def test_postgresql_word_search_matches_indexed_expression():
+    """The PostgreSQL search predicate must reuse the indexed tsvector expression."""
+    index = next(i for i in Story.__table__.indexes if i.name == "idx_story_search_tsv")
+    ddl = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+    assert "USING gin (to_tsvector(" in ddl
+    assert str(index.expressions[0].compile(dialect=postgresql.dialect())) == str(
+        story_search_vector().compile(dialect=postgresql.dialect())
+    )
+
+
+@pytest.mark.asyncio
+async def test_search_stories_total_counts_all_matches(engine):
+    """The windowed total covers every match, not just the returned page."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        for i in range(5):
+            await library.create_story(StoryCreate(title=f"Kedi {i}", content="Bir varmış bir yokmuş."))
+
+        stories, total = await library.search_stories(limit=2, offset=1)
+        assert (len(stories), total) == (2, 5)
+
+        stories, total = await library.search_stories(limit=2, offset=10)
+        assert (stories, total) == ([], 5)
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_play_count_and_session_completion_update_in_sql(engine):
+    """Counters and session durations are written by single UPDATE statements."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        story = await library.create_story(StoryCreate(title="Kedi", content="Bir varmış bir yokmuş."))
+        await library.increment_play_count(story.id)
+        await library.increment_play_count(story.id)
+
+        story_session = await library.create_session(SessionCreate(prompt="Kedi"))
+        await session.execute(text(
+            "UPDATE story_sessions SET start_time = datetime('now', '-90 seconds')"
+        ))
+        await session.commit()
+        await library.complete_session(story_session.session_id, story_id=story.id)
+        session.expunge_all()
+
+        result = await session.execute(select(Story.play_count, Story.last_played))
+        play_count, last_played = result.one()
+        assert play_count == 2 and last_played is not None
+
+        result = await session.execute(select(StorySession))
+        completed = result.scalar_one()
+        assert completed.status == "completed"
+        assert completed.story_id == story.id
+        assert completed.duration == pytest.approx(90, abs=2)
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_cleanup_old_events_deletes_expired_rows(engine):
+    """cleanup_old_events removes rows older than the cutoff and reports how many."""
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO system_events (event_type, message, timestamp) VALUES "
+            "('old', 'a', datetime('now', '-40 days')), ('old', 'b', datetime('now', '-31 days')), "
+            "('new', 'c', CURRENT_TIMESTAMP)"
+        ))
+
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        assert await library.cleanup_old_events(days=30) == 2
+
+        result = await session.execute(select(SystemEvent.event_type))
+        assert result.scalars().all() == ["new"]
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_session_stats_from_single_aggregate(engine):
+    """Session stats come back correct from the combined aggregate query."""
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO story_sessions (session_id, prompt, status, duration, wakeword_trigger, start_time) VALUES "
+            "('a', 'p', 'completed', 60, 'hey', CURRENT_TIMESTAMP), "
+            "('b', 'p', 'completed', 120, NULL, CURRENT_TIMESTAMP), "
+            "('c', 'p', 'failed', NULL, 'hey', CURRENT_TIMESTAMP), "
+            "('d', 'p', 'completed', 999, 'hey', datetime('now', '-60 days'))"
+        ))
+
+    session = await get_database_session(engine)
+    try:
+        stats = await StoryLibrary(session).get_session_stats(days=30)
+    finally:
+        await session.close()
+
+    assert stats["total_sessions"] == 3
+    assert stats["completed_sessions"] == 2
+    assert stats["average_duration_seconds"] == pytest.approx(90)
+    assert stats["wakeword_triggered_sessions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_story_lists_cached_until_story_write(engine):
+    """Popular/recent lists are served from memory and cleared by story writes."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        first = await library.create_story(StoryCreate(title="Kedi", content="Bir varmış bir yokmuş."))
+        assert [s.id for s in await library.get_recent_stories()] == [first.id]
+
+        # A write that bypasses the library is not seen while the entry is fresh
+        await session.execute(text("DELETE FROM stories"))
+        await session.commit()
+        assert [s.id for s in await library.get_recent_stories()] == [first.id]
+
+        second = await library.create_story(StoryCreate(title="Köpek", content="Küçük köpek uyudu."))
+        assert [s.id for s in await library.get_recent_stories()] == [second.id]
+
+        assert await library.get_popular_stories() == []
+        await library.increment_play_count(second.id)
+        assert [s.id for s in await library.get_popular_stories()] == [second.id]
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_event_writer_flushes_partial_batch_after_interval(engine):
+    """A batch smaller than batch_size is still written once flush_interval passes."""
+    writer = EventWriter(engine, batch_size=200, flush_interval=0.05)
+    await writer.start()
+    try:
+        writer.enqueue("tick", "One")
+        writer.enqueue("tick", "Two")
+        await asyncio.sleep(0.3)
+
+        async with engine.connect() as conn:
+            result = await conn.execute(select(SystemEvent.message).order_by(SystemEvent.id))
+            assert result.scalars().all() == ["One", "Two"]
+    finally:
+        await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_set_preference_upserts_single_row(engine):
+    """set_preference inserts once and then updates the same row in place."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        await library.set_preference("voice", "alloy", description="TTS voice")
+        await library.set_preference("voice", "nova")
+        await library.set_preference("themes", ["doğa", "uzay"])
+
+        result = await session.execute(
+            select(UserPreferences.key, UserPreferences.value, UserPreferences.value_type, UserPreferences.description)
+            .order_by(UserPreferences.key)
+        )
+        assert result.all() == [
+            ("themes", ["doğa", "uzay"], "json", "User preference: themes"),
+            ("voice", "nova", "str", "TTS voice"),
+        ]
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_theme_filter_matches_whole_themes(engine):
+    """Theme filtering uses story_themes and does not match theme substrings."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        sea = await library.create_story(StoryCreate(
+            title="Deniz", content="Bir varmış bir yokmuş.", themes=["deniz", "dostluk"]
+        ))
+        await library.create_story(StoryCreate(
+            title="Deniz kızı", content="Küçük deniz kızı uyudu.", themes=["deniz kızı"]
+        ))
+
+        stories, total = await library.search_stories(themes=["deniz"])
+        assert (total, [s.id for s in stories]) == (1, [sea.id])
+
+        stories, total = await library.search_stories(themes=["dostluk", "deniz kızı"])
+        assert total == 2
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_iter_stories_streams_full_stories(engine):
+    """iter_stories yields every matching story with its body loaded."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        await library.import_stories([
+            {"title": f"Kedi {i}", "content": f"Bir varmış bir yokmuş {i}.", "language": "tr" if i % 2 else "en"}
+            for i in range(7)
+        ])
+        session.expunge_all()
+
+        stories = [story async for story in library.iter_stories(language="tr", batch_size=2)]
+        assert [story.title for story in stories] == ["Kedi 1", "Kedi 3", "Kedi 5"]
+        assert all("content" in inspect(story).dict for story in stories)
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sql, index", [
+    ("SELECT id FROM stories WHERE is_favorite = 1 ORDER BY last_played DESC, created_at DESC LIMIT 50",
+     "idx_story_fav_played"),
+    ("SELECT id FROM stories WHERE play_count > 0 ORDER BY play_count DESC, created_at DESC LIMIT 10",
+     "idx_story_popular"),
+    ("SELECT id FROM scheduled_stories WHERE is_enabled = 1 ORDER BY schedule_time",
+     "idx_schedule_enabled_time"),
+])
+async def test_top_k_getters_use_matching_indexes(engine, sql, index):
+    """The getter queries are served in order by a matching index."""
+    async with engine.connect() as conn:
+        plan = (await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))).all()
+
+    details = " ".join(row[-1] for row in plan)
+    assert index in details
+    assert "TEMP B-TREE" not in details
+
+
+@pytest.mark.asyncio
+async def test_recent_sessions_load_only_response_columns(engine):
+    """Session listings load the response columns and a slim story, not metadata."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        story = await library.create_story(StoryCreate(title="Kedi", content="Bir varmış bir yokmuş."))
+        created = await library.create_session(SessionCreate(prompt="Kedi"))
+        await library.complete_session(created.session_id, story_id=story.id)
+        session.expunge_all()
+
+        sessions = await library.get_recent_sessions()
+        loaded = inspect(sessions[0]).dict
+        assert "session_metadata" not in loaded
+        assert SessionResponse.model_validate(sessions[0]).status == "completed"
+        assert "content" not in inspect(sessions[0].story).dict
+        assert StoryListResponse.model_validate(sessions[0].story).title == "Kedi"
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_sessions_created_in_same_second_get_distinct_ids(engine):
+    """Session ids are unique even when sessions start back to back."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        first = await library.create_session(SessionCreate(prompt="Kedi"))
+        second = await library.create_session(SessionCreate(prompt="Köpek"))
+        assert first.session_id != second.session_id
+        assert first.session_id.startswith("session_")
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_row_timestamps_keep_sub_second_precision(engine):
+    """Database-generated timestamps should not be truncated to the second."""
+    session = await get_database_session(engine)
+    try:
+        stories = [Story(title="Kedi", content="Bir varmış bir yokmuş.") for _ in range(2)]
+        session.add_all(stories)
+        await session.commit()
+
+        result = await session.execute(text("SELECT created_at FROM stories ORDER BY id"))
+        assert all("." in value for value in result.scalars())
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_recent_events_in_one_batch_come_newest_first(engine):
+    """Events sharing a timestamp are ordered by insertion, newest first."""
+    writer = EventWriter(engine)
+    await writer.start()
+    for i in range(5):
+        writer.enqueue("tick", f"Event {i}")
+    await writer.stop()
+
+    session = await get_database_session(engine)
+    try:
+        events = await StoryLibrary(session).get_recent_events(limit=3)
+        assert len({event.timestamp for event in events}) == 1
+        assert [event.message for event in events] == ["Event 4", "Event 3", "Event 2"]
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_event_writer_uses_shared_executor(engine):
+    """A caller-supplied executor runs the writes and outlives the writer."""
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="db")
+    try:
+        writer = EventWriter(engine, executor=executor)
+        await writer.start()
+        writer.enqueue("tick", "Shared")
+        await writer.stop()
+
+        assert executor.submit(lambda: "alive").result() == "alive"
+        async with engine.connect() as conn:
+            result = await conn.execute(select(SystemEvent.message))
+            assert result.scalars().all() == ["Shared"]
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_create_returns_database_defaults_without_refresh(engine):
+    """Sessions and schedules come back with ids and SQL defaults from the INSERT."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        story = await library.create_story(StoryCreate(title="Kedi", content="Bir varmış bir yokmuş."))
+
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        created = await library.create_session(SessionCreate(prompt="Kedi"))
+        schedule = await library.create_scheduled_story(ScheduledStoryCreate(
+            name="Uyku zamanı", story_id=story.id, schedule_time="20:30", days_of_week=[0]
+        ))
+
+        assert [s.split()[0] for s in statements] == ["INSERT", "INSERT"]
+        assert created.id is not None and created.start_time is not None
+        assert schedule.id is not None and schedule.created_at is not None
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_get_story_uses_identity_map(engine):
+    """Repeat get_story calls are served from the identity map with the body loaded."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        created = await library.create_story(StoryCreate(title="Kedi", content="Bir varmış bir yokmuş."))
+        session.expunge_all()
+
+        # Loaded by a list query first, so the body is still deferred
+        await library.search_stories()
+
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        story = await library.get_story(created.id)
+        assert story.content == "Bir varmış bir yokmuş."
+        assert len(statements) == 1
+
+        assert await library.get_story(created.id) is story
+        assert len(statements) == 1
+    finally:
+        await session.close()
+
+
+@pytest.mark.asyncio
+async def test_iter_recent_sessions_streams_list_columns(engine):
+    """iter_recent_sessions yields the requested page newest first as plain rows."""
+    session = await get_database_session(engine)
+    try:
+        library = StoryLibrary(session)
+        for i in range(5):
+            created = await library.create_session(SessionCreate(prompt=f"Kedi {i}"))
+            await library.update_session(created.session_id, start_time=datetime(2024, 1, 1, 20, i))
+
+        rows = [row async for row in library.iter_recent_sessions(limit=2, offset=1, batch_size=1)]
+        assert [row["prompt"] for row in rows] == ["Kedi 3", "Kedi 2"]
+        assert "session_metadata" not in rows[0]
+    finally:
+        await session.close()
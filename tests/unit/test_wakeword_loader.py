@@ -0,0 +1,200 @@
+"""
+Unit tests for the wakeword engine loader.
+"""
+
+import asyncio
+import importlib
+import logging
+import threading
+import types
+
+import pytest
+
+from storyteller.wakeword.loader import WakewordDetection, WakewordEngine, WakewordEngineLoader, EngineStatus
+
+
+class FakeEngine(WakewordEngine):
+    """Minimal in-memory wakeword engine."""
+
+    def __init__(self, config):
+        super().__init__("fake", config)
+        self.cleaned_up = False
+
+    async def initialize(self):
+        pass
+
+    async def start_listening(self, callback):
+        self.detection_callback = callback
+        self.is_listening = True
+
+    async def stop_listening(self):
+        self.is_listening = False
+
+    async def cleanup(self):
+        self.cleaned_up = True
+
+    def get_supported_keywords(self):
+        return ["hey fake"]
+
+    def get_memory_usage(self):
+        return {}
+
+
+@pytest.fixture
+def fake_loader(monkeypatch):
+    """Returns a loader with a fake engine registered and import_module counted."""
+    module = types.ModuleType("fake_wakeword_engine")
+
+    async def create_engine(config):
+        return FakeEngine(config)
+
+    module.create_engine = create_engine
+    imports = []
+
+    def import_module(name):
+        imports.append(name)
+        return module
+
+    monkeypatch.setattr(importlib, "import_module", import_module)
+    loader = WakewordEngineLoader()
+    loader._supported_engines["fake"] = "fake_wakeword_engine"
+    loader.imports = imports
+    return loader
+
+
+@pytest.mark.asyncio
+async def test_engine_module_imported_once(fake_loader):
+    """Reloading an engine reuses its cached create_engine function."""
+    first = await fake_loader.load_engine("fake", {})
+    second = await fake_loader.load_engine("fake", {})
+
+    assert first.cleaned_up is True
+    assert fake_loader.current_engine is second
+    assert fake_loader.status == EngineStatus.READY
+    assert fake_loader.imports == ["fake_wakeword_engine"]
+
+
+@pytest.mark.asyncio
+async def test_detection_wrapper_builds_detection(fake_loader):
+    """Detections carry the engine name and a monotonic nanosecond timestamp."""
+    engine = await fake_loader.load_engine("fake", {})
+    detections = []
+    await fake_loader.start_detection(detections.append)
+
+    engine.detection_callback("hey fake", 0.9)
+    engine.detection_callback("hey fake")
+
+    assert fake_loader.status == EngineStatus.LISTENING
+    assert [(d.keyword, d.confidence, d.engine_name) for d in detections] == [
+        ("hey fake", 0.9, "fake"),
+        ("hey fake", 1.0, "fake"),
+    ]
+    assert isinstance(detections[0].timestamp, int)
+    assert detections[0].timestamp <= detections[1].timestamp
+
+
+def test_wakeword_detection_is_slotted():
+    """Detections have no per-instance __dict__."""
+    detection = WakewordDetection("hey fake", 1.0, 0, "fake")
+    assert not hasattr(detection, "__dict__")
+
+
+@pytest.mark.asyncio
+async def test_unloaded_engine_is_freed(fake_loader, caplog):
+    """Switching engines frees the previous engine straight away."""
+    caplog.set_level(logging.DEBUG, logger="storyteller.wakeword.loader")
+    await fake_loader.load_engine("fake", {})
+    await fake_loader.load_engine("fake", {})
+
+    assert "Engine fake freed" in caplog.messages
+
+
+@pytest.mark.asyncio
+async def test_plain_callback_runs_on_event_loop():
+    """Plain callbacks run on the loop, so they can schedule tasks."""
+    engine = FakeEngine({})
+    scheduled = []
+
+    def callback(keyword):
+        scheduled.append(asyncio.get_running_loop().create_task(asyncio.sleep(0, keyword)))
+
+    engine.detection_callback = callback
+    await engine._notify_detection("hey fake")
+
+    assert await scheduled[0] == "hey fake"
+
+
+@pytest.mark.asyncio
+async def test_coroutine_callback_scheduled_as_task():
+    """Coroutine callbacks are scheduled without a thread hop."""
+    engine = FakeEngine({})
+    received = asyncio.Event()
+
+    async def callback(keyword):
+        received.set()
+
+    engine.detection_callback = callback
+    await engine._notify_detection("hey fake")
+    await asyncio.wait_for(received.wait(), 1)
+
+
+@pytest.mark.asyncio
+async def test_callback_in_executor_when_configured():
+    """Blocking callbacks can opt in to running on a worker thread."""
+    engine = FakeEngine({"callback_in_executor": True})
+    threads = []
+    engine.detection_callback = lambda keyword: threads.append(threading.current_thread())
+
+    await engine._notify_detection("hey fake")
+
+    assert threads and threads[0] is not threading.main_thread()
+
+
+@pytest.mark.asyncio
+async def test_failing_callback_is_contained():
+    """A handler error is logged instead of ending detection."""
+    engine = FakeEngine({})
+
+    def callback(keyword):
+        raise KeyError(keyword)
+
+    engine.detection_callback = callback
+    await engine._notify_detection("hey fake")
+
+
+@pytest.mark.asyncio
+async def test_coroutine_callback_task_kept_until_done():
+    """Running callback tasks are referenced by the engine and released after."""
+    engine = FakeEngine({})
+    release = asyncio.Event()
+
+    async def callback(keyword):
+        await release.wait()
+
+    engine.detection_callback = callback
+    await engine._notify_detection("hey fake")
+    assert len(engine._callback_tasks) == 1
+    task = next(iter(engine._callback_tasks))
+
+    release.set()
+    await task
+    await asyncio.sleep(0)
+    assert not engine._callback_tasks
+
+
+@pytest.mark.asyncio
+async def test_failing_coroutine_callback_is_logged(caplog):
+    """Errors raised inside a callback task are logged when it finishes."""
+    engine = FakeEngine({})
+
+    async def callback(keyword):
+        raise KeyError(keyword)
+
+    engine.detection_callback = callback
+    with caplog.at_level(logging.ERROR, logger="storyteller.wakeword.loader"):
+        await engine._notify_detection("hey fake")
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+    assert not engine._callback_tasks
+    assert "Wake word callback failed: 'hey fake'" in caplog.text
@@ -0,0 +1,304 @@
+"""
+Unit tests for web API responses.
+"""
+
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import jinja2
+import orjson
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from storyteller.config.settings import get_settings
+from storyteller.storage.models import SessionCreate, create_database_engine, create_tables, get_database_session
+from storyteller.storage.story_library import StoryLibrary
+from storyteller.web import app as web_module
+from storyteller.web.app import WebApplication
+
+
+@pytest.fixture
+def client():
+    """Provides a test client for a WebApplication without agent or library."""
+    return TestClient(WebApplication().app)
+
+
+def test_all_json_routes_declare_response_models():
+    """Every API route has a response model, so FastAPI serializes it with Pydantic.
+    
+    Streamed routes encode their own body and document the model instead.
+    """
+    app = WebApplication().app
+    api_routes = [route for route in app.routes if getattr(route, "path", "").startswith("/api/")]
+    assert api_routes
+    assert all(
+        route.response_model is not None or "model" in route.responses.get(200, {})
+        for route in api_routes
+    )
+
+
+def test_settings_endpoint(client):
+    """GET /api/settings returns the exposed settings."""
+    response = client.get("/api/settings")
+    assert response.status_code == 200
+    settings = get_settings()
+    assert response.json() == {
+        "wakeword_engine": settings.wakeword_engine,
+        "story_language": settings.story_language,
+        "story_age_rating": settings.story_age_rating,
+        "story_max_paragraphs": settings.story_max_paragraphs,
+        "max_memory_mb": settings.max_memory_mb,
+        "content_safety_enabled": settings.content_safety_enabled,
+    }
+
+
+def test_status_without_agent(client):
+    """GET /api/status reports offline before the agent is attached."""
+    response = client.get("/api/status")
+    assert response.status_code == 200
+    assert response.json()["state"] == "offline"
+
+
+def stored_session(index: int):
+    """A stand-in for a streamed session row."""
+    return {
+        "session_id": f"session-{index}",
+        "prompt": "A dragon who loves tea",
+        "language": "en",
+        "age_rating": "5+",
+        "status": "completed",
+        "start_time": datetime(2024, 1, 1, 20, 0),
+        "end_time": datetime(2024, 1, 1, 20, 10),
+        "paragraphs_generated": 5,
+    }
+
+
+def streamed(rows):
+    """Mock for StoryLibrary.iter_recent_sessions yielding the given rows."""
+    async def iterate(**kwargs):
+        for row in rows:
+            yield row
+
+    return MagicMock(side_effect=iterate)
+
+
+def failing_stream(rows):
+    """Mock for StoryLibrary.iter_recent_sessions failing after the given rows."""
+    async def iterate(**kwargs):
+        for row in rows:
+            yield row
+        raise RuntimeError("database is locked")
+
+    return MagicMock(side_effect=iterate)
+
+
+def test_list_stories_failure_before_first_row_is_500():
+    """A query that fails up front answers 500, not an empty array."""
+    web_app = WebApplication()
+    web_app.story_library = MagicMock()
+    web_app.story_library.iter_recent_sessions = failing_stream([])
+
+    response = TestClient(web_app.app).get("/api/stories")
+
+    assert response.status_code == 500
+    assert response.json()["detail"] == "database is locked"
+
+
+def test_list_stories_failure_mid_stream_aborts_response():
+    """A failure after rows were sent aborts the body instead of closing the array."""
+    web_app = WebApplication()
+    web_app.story_library = MagicMock()
+    web_app.story_library.iter_recent_sessions = failing_stream([stored_session(0)])
+
+    with pytest.raises(RuntimeError, match="database is locked"):
+        TestClient(web_app.app).get("/api/stories")
+
+
+def test_list_stories_streams_stored_sessions():
+    """Stored sessions are streamed as a gzip-compressed JSON array."""
+    web_app = WebApplication()
+    web_app.story_library = MagicMock()
+    web_app.story_library.iter_recent_sessions = streamed([stored_session(i) for i in range(10)])
+
+    response = TestClient(web_app.app).get("/api/stories", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    stories = response.json()
+    assert len(stories) == 10
+    assert stories[0]["session_id"] == "session-0"
+    assert stories[0]["created_at"] == "2024-01-01T20:00:00"
+    assert stories[0]["completed_at"] == "2024-01-01T20:10:00"
+    web_app.story_library.iter_recent_sessions.assert_called_once_with(limit=20, offset=0)
+
+
+def test_list_stories_empty():
+    """An empty library streams an empty JSON array."""
+    web_app = WebApplication()
+    web_app.story_library = MagicMock()
+    web_app.story_library.iter_recent_sessions = streamed([])
+
+    response = TestClient(web_app.app).get("/api/stories?limit=5&offset=10")
+
+    assert response.json() == []
+    web_app.story_library.iter_recent_sessions.assert_called_once_with(limit=5, offset=10)
+
+
+@pytest.mark.parametrize("body", [
+    {"prompt": "A sleepy owl", "language": "de"},
+    {"prompt": "A sleepy owl", "age_rating": "five"},
+])
+def test_create_story_rejects_invalid_request(client, body):
+    """Language and age rating are validated by the shared constrained types."""
+    response = client.post("/api/stories", json=body)
+    assert response.status_code == 422
+
+
+@pytest.fixture
+def web_app_with_agent():
+    """Provides a WebApplication whose agent reports a slow provider health check."""
+    web_app = WebApplication()
+    web_app.agent = MagicMock()
+    web_app.agent.get_status.return_value = {"state": "idle", "is_running": True}
+    web_app.agent.hardware_manager.get_hardware_info.return_value = {"status": "ok"}
+
+    async def health_check():
+        await asyncio.sleep(0.01)
+        return {"overall_status": "healthy"}
+
+    web_app.agent.provider_manager.health_check = AsyncMock(side_effect=health_check)
+    return web_app
+
+
+@pytest.mark.asyncio
+async def test_concurrent_status_requests_share_one_build(web_app_with_agent):
+    """A burst of status requests runs the provider health check once."""
+    web_app = web_app_with_agent
+    statuses = await asyncio.gather(*(web_app._get_cached_status() for _ in range(5)))
+
+    assert all(status is statuses[0] for status in statuses)
+    assert statuses[0].provider_status == {"overall_status": "healthy"}
+    web_app.agent.provider_manager.health_check.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_status_rebuilt_after_ttl(web_app_with_agent):
+    """The cached status is reused until it is STATUS_CACHE_TTL old."""
+    web_app = web_app_with_agent
+
+    await web_app._get_cached_status()
+    await web_app._get_cached_status()
+    assert web_app.agent.provider_manager.health_check.await_count == 1
+
+    built_at, status = web_app._status_cache
+    web_app._status_cache = (built_at - web_module.STATUS_CACHE_TTL, status)
+    await web_app._get_cached_status()
+    assert web_app.agent.provider_manager.health_check.await_count == 2
+
+
+@pytest.mark.parametrize("path", ["/", "/stories", "/settings"])
+def test_pages_render(client, path):
+    """HTML pages render from the cached template environment."""
+    response = client.get(path)
+    assert response.status_code == 200
+    assert "Bedtime Storyteller" in response.text
+
+
+def test_templates_not_rechecked_outside_debug():
+    """Template files are only stat'ed for edits in debug mode."""
+    env = WebApplication().templates.env
+    assert env.auto_reload is bool(get_settings().debug)
+    assert isinstance(env.bytecode_cache, jinja2.FileSystemBytecodeCache)
+    assert env.autoescape is True
+
+
+@pytest.mark.parametrize("name, cache_control", [
+    ("app-3f9a1c2b.css", web_module.IMMUTABLE_CACHE_CONTROL),
+    ("app.css", None),
+])
+def test_static_cache_headers(tmp_path, name, cache_control):
+    """Only fingerprinted static files are marked immutable."""
+    (tmp_path / name).write_text("body { margin: 0; }")
+    app = Starlette(routes=[Mount("/static", web_module.CachedStaticFiles(directory=str(tmp_path)))])
+
+    response = TestClient(app).get(f"/static/{name}")
+
+    assert response.status_code == 200
+    assert response.headers.get("cache-control") == cache_control
+
+
+def test_current_session_validated_from_agent_status():
+    """The agent's session dict maps straight onto SessionInfo."""
+    session = WebApplication()._format_session_info({
+        "session_id": "abc",
+        "prompt": "A sleepy owl",
+        "language": "en",
+        "age_rating": "3+",
+        "start_time": 1704139200.0,
+        "paragraphs_generated": 2,
+        "paragraphs_played": 1,
+        "duration": 12.5,
+        "status": "active",
+    })
+
+    assert session.session_id == "abc"
+    assert session.age_rating == "3+"
+    assert session.created_at.timestamp() == 1704139200.0
+    assert session.completed_at is None
+
+
+def test_trigger_wake_passes_manual_detection():
+    """POST /api/wake hands the agent a manual detection."""
+    web_app = WebApplication()
+    web_app.agent = MagicMock()
+
+    response = TestClient(web_app.app).post("/api/wake")
+
+    assert response.status_code == 200
+    detection = web_app.agent._on_wake_word_detected.call_args.args[0]
+    assert (detection.keyword, detection.engine_name) == ("manual_trigger", "web_interface")
+
+
+@pytest_asyncio.fixture
+async def web_app_with_database(tmp_path):
+    """Provides a WebApplication attached to a SQLite database with two sessions."""
+    engine = await create_database_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    await create_tables(engine)
+    shared_session = await get_database_session(engine)
+    library = StoryLibrary(shared_session)
+    for prompt in ("Kedi", "Köpek"):
+        await library.create_session(SessionCreate(prompt=prompt))
+
+    web_app = WebApplication()
+    await web_app.initialize(None, library, engine)
+    yield web_app
+
+    await shared_session.close()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_each_request_gets_its_own_database_session(web_app_with_database):
+    """Request-scoped libraries use a fresh session, not the application's."""
+    web_app = web_app_with_database
+    async with web_app._story_library_scope() as first, web_app._story_library_scope() as second:
+        assert first.session is not web_app.story_library.session
+        assert first.session is not second.session
+
+
+@pytest.mark.asyncio
+async def test_list_stories_from_database(web_app_with_database):
+    """The story list streams rows through a request-scoped session."""
+    chunks = [chunk async for chunk in web_app_with_database._iter_sessions_json(limit=20, offset=0)]
+    stories = orjson.loads(b"".join(chunks))
+    assert sorted(story["prompt"] for story in stories) == ["Kedi", "Köpek"]
+
+
+def test_story_routes_unavailable_without_library(client):
+    """Routes needing the library answer 503 before it is attached."""
+    assert client.get("/api/stories/abc").status_code == 503
+    assert client.delete("/api/stories/abc").status_code == 503
@@ -0,0 +1,105 @@
+"""
+Unit tests for web application WebSocket broadcasting.
+"""
+
+import asyncio
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock
+
+from storyteller.web.app import WebApplication, WebSocketOutbox
+
+
+@pytest.fixture
+def web_app():
+    """Provides a WebApplication without agent or library."""
+    return WebApplication()
+
+
+def make_websocket(fails: bool = False):
+    """Create a WebSocket stand-in whose sends succeed or fail."""
+    websocket = AsyncMock()
+    if fails:
+        websocket.send_bytes.side_effect = RuntimeError("connection closed")
+    return websocket
+
+
+def sent_payloads(websocket):
+    """Payloads passed to send_bytes, in order."""
+    return [call.args[0] for call in websocket.send_bytes.await_args_list]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_serializes_once_for_all_clients(web_app):
+    """Every client's outbox receives the same pre-serialized payload."""
+    outboxes = [WebSocketOutbox(), WebSocketOutbox()]
+    for outbox in outboxes:
+        web_app.websocket_connections[make_websocket()] = outbox
+
+    message = {"type": "state_change", "state": "idle"}
+    await web_app._broadcast_update(message)
+
+    payloads = [outbox.messages[0] for outbox in outboxes]
+    assert payloads[0] is payloads[1]
+    assert orjson.loads(payloads[0]) == message
+
+
+@pytest.mark.asyncio
+async def test_writer_sends_updates_in_order(web_app):
+    """The writer task wakes on new updates and sends them in order."""
+    websocket, outbox = make_websocket(), WebSocketOutbox()
+    web_app.websocket_connections[websocket] = outbox
+    writer = asyncio.create_task(web_app._writer(websocket, outbox))
+    await asyncio.sleep(0)
+
+    await web_app._broadcast_update({"n": 1})
+    await web_app._broadcast_update({"n": 2})
+    await asyncio.sleep(0)
+
+    assert [orjson.loads(p) for p in sent_payloads(websocket)] == [{"n": 1}, {"n": 2}]
+    writer.cancel()
+    await writer
+
+
+@pytest.mark.asyncio
+async def test_writer_prunes_failed_connection(web_app):
+    """A client whose send fails is removed; the rest still receive the update."""
+    healthy, broken = make_websocket(), make_websocket(fails=True)
+    writers = []
+    for websocket in (broken, healthy):
+        outbox = WebSocketOutbox()
+        web_app.websocket_connections[websocket] = outbox
+        writers.append(asyncio.create_task(web_app._writer(websocket, outbox)))
+    await asyncio.sleep(0)
+
+    await web_app._broadcast_update({"type": "story_started"})
+    await asyncio.sleep(0)
+
+    assert len(sent_payloads(healthy)) == 1
+    assert list(web_app.websocket_connections) == [healthy]
+    for writer in writers:
+        writer.cancel()
+    await asyncio.gather(*writers)
+
+
+def test_outbox_drops_oldest_when_full():
+    """A client that stops reading keeps only the newest updates."""
+    outbox = WebSocketOutbox(max_pending=2)
+    for payload in (b"1", b"2", b"3"):
+        outbox.put(payload)
+    assert list(outbox.messages) == [b"2", b"3"]
+
+
+def test_websocket_receives_updates_and_ignores_client_frames():
+    """Clients get binary updates; text or binary frames they send are ignored."""
+    web_app = WebApplication()
+
+    with TestClient(web_app.app) as client, client.websocket_connect("/ws") as websocket:
+        websocket.send_text("ping")
+        websocket.send_bytes(b"\x00")
+        client.portal.call(web_app._broadcast_update, {"type": "state_change", "state": "idle"})
+        assert orjson.loads(websocket.receive_bytes()) == {"type": "state_change", "state": "idle"}
+
+    assert not web_app.websocket_connections
@@ -0,0 +1,36 @@
+"""
+Unit tests for web server startup options.
+"""
+
+from unittest.mock import patch
+
+from storyteller.web import app as web_module
+
+
+def fake_find_spec(installed):
+    """find_spec stand-in reporting only the given modules as installed."""
+    return lambda name: object() if name in installed else None
+
+
+def test_run_server_uses_fast_uvicorn_backends_when_installed():
+    """Installed fast backends are pinned unless overridden."""
+    installed = {"uvloop", "httptools", "websockets"}
+    with patch.object(web_module.uvicorn, "run") as uvicorn_run, \
+            patch.object(web_module.importlib.util, "find_spec", fake_find_spec(installed)):
+        web_module.run_server("0.0.0.0", 5000, http="h11")
+    options = uvicorn_run.call_args.kwargs
+    assert options["loop"] == "uvloop"
+    assert options["ws"] == "websockets"
+    assert options["http"] == "h11"
+    assert "workers" not in options
+
+
+def test_run_server_leaves_missing_backends_on_auto():
+    """Without uvloop or httptools, uvicorn picks its own fallbacks."""
+    with patch.object(web_module.uvicorn, "run") as uvicorn_run, \
+            patch.object(web_module.importlib.util, "find_spec", fake_find_spec({"websockets"})):
+        web_module.run_server("0.0.0.0", 5000)
+    options = uvicorn_run.call_args.kwargs
+    assert "loop" not in options
+    assert "http" not in options
+    assert options["ws"] == "websockets"